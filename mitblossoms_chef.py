@@ -1,25 +1,31 @@
 #!/usr/bin/env python
 import argparse
-from itertools import groupby
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import copy
+import functools
+import gzip
+import hashlib
+from itertools import count, groupby
 import json
 import os
+import queue
+import random
 import re
-import shutil
+import socket
 import sys
-import tempfile
+import zipfile
+import threading
+import time
+from urllib.parse import urljoin, urlparse
 
-from bs4 import BeautifulSoup
+from bs4 import BeautifulSoup, SoupStrainer
 import requests
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
 
-# from le_utils.constants import content_kinds
-from le_utils.constants import licenses
-from le_utils import constants
-from ricecooker.chefs import SushiChef
-from ricecooker.classes import nodes, files
-from ricecooker.classes.licenses import get_license
-from ricecooker.exceptions import UnknownFileTypeError, raise_for_invalid_channel
-from ricecooker.utils.caching import CacheForeverHeuristic, FileCache, CacheControlAdapter
-from ricecooker.utils.zip import create_predictable_zip
+# NOTE: ricecooker and le_utils are imported lazily in the functions that need
+# them so that `--parts crawlonly` and `--parts scrapeonly` start fast, see
+# `docs/import_time_budget.txt` for the startup time budget we keep.
 
 
 # LOGGING SETTINGS
@@ -43,9 +49,30 @@ CHANNEL_SOURCE_ID = 'mit_blossoms_v1.0b'
 CHANNEL_TITLE = 'MIT Blossoms'
 CHANNEL_THUMBNAIL = 'https://pk12.mit.edu/files/2016/02/MIT-Blossoms.png'
 CHANNEL_LANGUAGE='en'
-MIT_BLOSSOMS_LICENSE = get_license(licenses.CC_BY_NC_SA, copyright_holder='MIT Blossoms')
+MIT_BLOSSOMS_LICENSE_ID = 'CC BY-NC-SA'   # le_utils.constants.licenses.CC_BY_NC_SA
+MIT_BLOSSOMS_COPYRIGHT_HOLDER = 'MIT Blossoms'
 DATA_DIR = 'chefdata'
 ZIP_FILES_TMP_DIR = os.path.join(DATA_DIR, 'zipfiles')
+LESSON_INDEX = os.path.join(DATA_DIR, 'lesson_index.json')
+LESSON_CATALOG = os.path.join(DATA_DIR, 'lesson_catalog.json')
+REMOTE_FILES_MANIFEST = os.path.join(DATA_DIR, 'remote_files_manifest.json')
+TREE_FORMATS = ['json', 'jsonl', 'jsonl.gz']   # see JSON TREE FILES below
+PROFILES_DIR = os.path.join(DATA_DIR, 'profiles')
+PROFILE_TOP_N = 25
+SAMPLE_SIZE = 2   # lessons per topic and per topic cluster scraped with --pruned
+SAMPLE_SEED = 0
+PRECHECK_WORKERS = 8
+THUMBNAILS_DIR = os.path.join(DATA_DIR, 'thumbnails')
+THUMBNAIL_SIZE = (400, 225)   # 16:9, the aspect ratio of thumbnails in Kolibri
+THUMBNAIL_WORKERS = 4
+VIDEOS_DIR = os.path.join(DATA_DIR, 'videos')
+VIDEO_DOWNLOAD_WORKERS = 2
+DOCUMENTS_DIR = os.path.join(DATA_DIR, 'documents')
+DOCUMENTS_CACHE = os.path.join(DATA_DIR, 'documents_cache.json')
+DOCUMENTS_MANIFEST = os.path.join(DATA_DIR, 'documents_manifest.json')
+DOCUMENT_WORKERS = os.cpu_count() or 1
+CHANNEL_DIFF_REPORT = os.path.join(DATA_DIR, 'channel_diff.json')
+PRECHECK_TIMEOUT = 30   # seconds
 CONTENT_DIR = 'content'
 BASE_URL = 'https://blossoms.mit.edu'
 VIDEOS_BY_LANGUAGE_PATH = '/videos/by_language'
@@ -117,25 +144,503 @@ BLOSSOMS_FMT = {
 
 # CACHE LOGIC
 ################################################################################
-SESSION = requests.Session()
-cache = FileCache('.webcache')
-forever_adapter= CacheControlAdapter(heuristic=CacheForeverHeuristic(), cache=cache)
-SESSION.mount('https://blossoms.mit.edu', forever_adapter)          # TODO: change this in final version
-SESSION.mount('http://d1baxxa0joomi3.cloudfront.net', forever_adapter)
-SESSION.mount('http://techtv.mit.edu', forever_adapter)
+WEBCACHE_DIR = '.webcache'
+WEBCACHE_INDEX = 'urls.jsonl'   # file in WEBCACHE_DIR with the urls of the cached responses
+CACHED_URL_PREFIXES = [
+    'https://blossoms.mit.edu',             # TODO: change this in final version
+    'http://d1baxxa0joomi3.cloudfront.net',
+    'http://techtv.mit.edu',
+]
+_SESSION = None
+
+class IndexedCache(object):
+    """
+    Wraps the `FileCache` of the session to record the url of each response it
+    stores in WEBCACHE_INDEX, since the cache files are named by the hash of
+    the url only. The index is used by the `webcache` part.
+    """
+    def __init__(self, cache, index_path=os.path.join(WEBCACHE_DIR, WEBCACHE_INDEX)):
+        self.cache = cache
+        self.index_path = index_path
+        self._indexed_keys = set(read_webcache_index(index_path))
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        return self.cache.get(key)
+
+    def set(self, key, value, expires=None):
+        self.cache.set(key, value, expires)
+        with self._lock:
+            if key not in self._indexed_keys:
+                self._indexed_keys.add(key)
+                with open(self.index_path, 'a') as index_file:
+                    index_file.write(json.dumps(dict(url=key)) + '\n')
+
+    def delete(self, key):
+        self.cache.delete(key)
+
+    def close(self):
+        self.cache.close()
+
+def read_webcache_index(index_path):
+    """
+    Returns the list of urls in the web cache index `index_path`.
+    """
+    urls = []
+    if os.path.exists(index_path):
+        with open(index_path) as index_file:
+            for line in index_file:
+                if line.strip():
+                    urls.append(json.loads(line)['url'])
+    return urls
+
+def get_session():
+    """
+    Returns the cached `requests.Session` used for all web requests.
+    The session and its adapters are created on first use: each host in
+    CACHED_URL_PREFIXES gets its own caching adapter (and connection pool),
+    and all other hosts use plain adapters with the same pool options.
+    """
+    global _SESSION
+    if _SESSION is None:
+        from ricecooker.utils.caching import CacheForeverHeuristic, FileCache, CacheControlAdapter
+        session = requests.Session()
+        cache = IndexedCache(FileCache(WEBCACHE_DIR))
+        for prefix in CACHED_URL_PREFIXES:
+            forever_adapter = CacheControlAdapter(heuristic=CacheForeverHeuristic(), cache=cache)
+            session.mount(prefix, _configure_pools(forever_adapter))
+        for prefix in ['http://', 'https://']:
+            session.mount(prefix, _configure_pools(requests.adapters.HTTPAdapter()))
+        session.hooks['response'].append(_count_response)
+        session.hooks['response'].append(_emit_response_event)
+        _SESSION = session
+    return _SESSION
+
+_DOWNLOAD_SESSION = None
+
+def get_download_session():
+    """
+    Returns the `requests.Session` used to stream large files to disk. It has
+    no cache, since the caching adapter keeps the whole response in memory.
+    """
+    global _DOWNLOAD_SESSION
+    if _DOWNLOAD_SESSION is None:
+        session = requests.Session()
+        for prefix in ['http://', 'https://']:
+            session.mount(prefix, _configure_pools(requests.adapters.HTTPAdapter()))
+        session.hooks['response'].append(_count_response)
+        session.hooks['response'].append(_emit_response_event)
+        _DOWNLOAD_SESSION = session
+    return _DOWNLOAD_SESSION
+
+
+
+# CONNECTION POOLS
+################################################################################
+# The pool options can be changed with `--pool-maxsize`, `--pool-block`, and
+# `--no-tcp-keepalive` (see `set_connection_pool_options`). Each pool counts
+# the TCP connections it opens, so we can report how often connections are
+# reused (see `get_connection_stats`).
+POOL_MAXSIZE = 10        # keep >= the number of concurrent workers of any part
+POOL_BLOCK = False       # if True, wait for a free connection instead of discarding extra ones
+TCP_KEEPALIVE = True     # enable SO_KEEPALIVE on pooled connections
+_POOL_OPTIONS = dict(pool_maxsize=POOL_MAXSIZE, pool_block=POOL_BLOCK, tcp_keepalive=TCP_KEEPALIVE)
+_CONNECTION_STATS = {}   # {host: {'requests': int, 'connections': int}}
+_CONNECTION_STATS_LOCK = threading.Lock()
+
+def set_connection_pool_options(pool_maxsize=POOL_MAXSIZE, pool_block=POOL_BLOCK, tcp_keepalive=TCP_KEEPALIVE):
+    """
+    Set the connection pool options. Must be called before `get_session()`.
+    """
+    _POOL_OPTIONS.update(pool_maxsize=pool_maxsize, pool_block=pool_block, tcp_keepalive=tcp_keepalive)
+
+def _count_stat(host, key):
+    with _CONNECTION_STATS_LOCK:
+        stats = _CONNECTION_STATS.setdefault(host, dict(requests=0, connections=0))
+        stats[key] += 1
+
+class _CountingHTTPConnection(HTTPConnection):
+    def connect(self):
+        _count_stat(self.host, 'connections')
+        super(_CountingHTTPConnection, self).connect()
+
+class _CountingHTTPSConnection(HTTPSConnection):
+    def connect(self):
+        _count_stat(self.host, 'connections')
+        super(_CountingHTTPSConnection, self).connect()
+
+class _CountingHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = _CountingHTTPConnection
+
+class _CountingHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = _CountingHTTPSConnection
+
+def _configure_pools(adapter, pool_maxsize=None, pool_block=None, tcp_keepalive=None, count_connections=True):
+    """
+    Re-initialize the pool manager of `adapter` with the connection pool options
+    and (if `count_connections`) the connection counting pools. Returns the adapter.
+    """
+    pool_maxsize = _POOL_OPTIONS['pool_maxsize'] if pool_maxsize is None else pool_maxsize
+    pool_block = _POOL_OPTIONS['pool_block'] if pool_block is None else pool_block
+    tcp_keepalive = _POOL_OPTIONS['tcp_keepalive'] if tcp_keepalive is None else tcp_keepalive
+    socket_options = list(HTTPConnection.default_socket_options)
+    if tcp_keepalive:
+        socket_options.append((socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1))
+    adapter.init_poolmanager(requests.adapters.DEFAULT_POOLSIZE, pool_maxsize,
+                             block=pool_block, socket_options=socket_options)
+    if count_connections:
+        adapter.poolmanager.pool_classes_by_scheme = {
+            'http': _CountingHTTPConnectionPool,
+            'https': _CountingHTTPSConnectionPool,
+        }
+    return adapter
+
+def _count_response(resp, *args, **kwargs):
+    if not getattr(resp, 'from_cache', False):
+        _count_stat(urlparse(resp.url).hostname, 'requests')
+
+def get_connection_stats():
+    """
+    Returns a dict {host: {requests, connections, reused}} of the network
+    requests sent so far (cache hits are not counted) and the TCP connections
+    opened for them.
+    """
+    with _CONNECTION_STATS_LOCK:
+        connection_stats = {}
+        for host, stats in _CONNECTION_STATS.items():
+            connection_stats[host] = dict(stats, reused=max(stats['requests'] - stats['connections'], 0))
+        return connection_stats
+
+def log_connection_stats():
+    connection_stats = get_connection_stats()
+    if not connection_stats:
+        return
+    logger.info('Connection reuse by host:')
+    for host, stats in sorted(connection_stats.items()):
+        logger.info('  {:<40} {:>6} requests  {:>5} connections  {:>6} reused'.format(
+            host, stats['requests'], stats['connections'], stats['reused']))
+    emit_event('connection_stats', hosts=connection_stats)
+
+
+
+# PROGRESS EVENTS
+################################################################################
+# With `--events PATH` every stage writes structured progress events, one json
+# object per line, to the file or pipe PATH (use `-` for stdout). Each event has
+# `ts` (unix time) and `event` (one of the names below) plus event-specific data:
+#   - part_started, part_finished          part, duration
+#   - scrape_started                       total_lessons
+#   - lesson_started, lesson_finished      url, title, duration, num_videos
+#   - video_resolved                       url, lang, lang_variant, found, duration
+#   - fetch_done, cache_hit                url, host, method, status, duration
+#   - connection_stats                     hosts (see `get_connection_stats`)
+# and one event for each item processed by the later stages:
+#   - file_checked                         url, status, ok, duration    (precheck)
+#   - thumbnail_fetched                    url, ok, duration            (thumbnails)
+#   - video_downloaded                     url, size, ok, duration      (video prefetch)
+#   - node_built                           kind, source_id, duration    (construct)
+ITEM_EVENTS = ['file_checked', 'thumbnail_fetched', 'video_downloaded', 'node_built']
+_EVENTS_FILE = None
+_EVENTS_LOCK = threading.Lock()
+
+def open_event_stream(path):
+    global _EVENTS_FILE
+    if path == '-':
+        _EVENTS_FILE = sys.stdout
+    else:
+        _EVENTS_FILE = open(path, 'a', buffering=1)   # line buffered for pipes
+
+def emit_event(event, **data):
+    """
+    Write the progress event `event` with `data` to the event stream (if open).
+    """
+    if _EVENTS_FILE is None:
+        return
+    record = dict(ts=round(time.time(), 3), event=event)
+    record.update(data)
+    line = json.dumps(record, separators=(',', ':'))
+    with _EVENTS_LOCK:
+        _EVENTS_FILE.write(line + '\n')
+        _EVENTS_FILE.flush()
+
+def _emit_response_event(resp, *args, **kwargs):
+    if _EVENTS_FILE is None:
+        return
+    from_cache = getattr(resp, 'from_cache', False)
+    emit_event(
+        'cache_hit' if from_cache else 'fetch_done',
+        url=resp.url,
+        host=urlparse(resp.url).netloc,
+        method=resp.request.method,
+        status=resp.status_code,
+        duration=0.0 if from_cache else round(resp.elapsed.total_seconds(), 3),
+    )
+
+def read_events(path):
+    with open(path) as events_file:
+        for line in events_file:
+            line = line.strip()
+            if line:
+                yield json.loads(line)
+
+def summarize_events(events, bucket_seconds=60, num_slowest=10):
+    """
+    Summarize a progress event stream. Returns a dict with:
+      - throughput: list of {start, lessons, fetches, cache_hits} per time bucket
+      - lessons_done, total_lessons, and eta (seconds, based on the last 5 buckets)
+      - slowest_lessons: the `num_slowest` slowest lessons
+      - hosts: number of fetches and average fetch duration for each host
+      - items: number of items, failed items, and total duration for each of ITEM_EVENTS
+    """
+    buckets = {}
+    slowest_lessons = []
+    hosts = {}
+    items = {}
+    total_lessons = None
+    lessons_done = 0
+    first_ts, last_ts = None, None
+    for event in events:
+        ts = event['ts']
+        first_ts = ts if first_ts is None else first_ts
+        last_ts = ts
+        bucket = buckets.setdefault(int(ts // bucket_seconds) * bucket_seconds,
+                                    dict(lessons=0, fetches=0, cache_hits=0))
+        if event['event'] == 'scrape_started':
+            total_lessons = event['total_lessons']
+            lessons_done = 0
+        elif event['event'] == 'lesson_finished':
+            lessons_done += 1
+            bucket['lessons'] += 1
+            slowest_lessons.append((event['duration'], event['url']))
+        elif event['event'] == 'fetch_done':
+            bucket['fetches'] += 1
+            host = hosts.setdefault(event['host'], dict(fetches=0, total_duration=0.0))
+            host['fetches'] += 1
+            host['total_duration'] += event['duration']
+        elif event['event'] == 'cache_hit':
+            bucket['cache_hits'] += 1
+        elif event['event'] in ITEM_EVENTS:
+            item = items.setdefault(event['event'], dict(count=0, failed=0, total_duration=0.0))
+            item['count'] += 1
+            item['failed'] += 0 if event.get('ok', True) else 1
+            item['total_duration'] += event.get('duration') or 0.0
+
+    throughput = [dict(start=start, **counts) for start, counts in sorted(buckets.items())]
+    eta = None
+    if total_lessons is not None and lessons_done < total_lessons:
+        recent = throughput[-5:]   # throughput is not empty since there was a scrape_started
+        recent_lessons = sum(b['lessons'] for b in recent)
+        recent_seconds = max(last_ts - max(recent[0]['start'], first_ts), 1)
+        if recent_lessons:
+            eta = (total_lessons - lessons_done) * recent_seconds / recent_lessons
+    for host in hosts.values():
+        host['avg_duration'] = host['total_duration'] / host['fetches']
+    slowest_lessons = sorted(slowest_lessons, reverse=True)[:num_slowest]
+    return dict(
+        throughput=throughput,
+        lessons_done=lessons_done,
+        total_lessons=total_lessons,
+        eta=eta,
+        elapsed=(last_ts - first_ts) if first_ts is not None else 0,
+        slowest_lessons=[dict(duration=d, url=url) for d, url in slowest_lessons],
+        hosts=hosts,
+        items=items,
+    )
+
+def events_summary_part(args, options):
+    """
+    Print a summary of the progress events in args['events'].
+    """
+    if not args['events']:
+        raise ValueError('--events is required for the eventsummary part')
+    summary = summarize_events(read_events(args['events']))
+    logger.info('Throughput per minute:')
+    for bucket in summary['throughput']:
+        logger.info('  {}  {:>4} lessons  {:>5} fetches  {:>5} cache hits'.format(
+            time.strftime('%H:%M', time.localtime(bucket['start'])),
+            bucket['lessons'], bucket['fetches'], bucket['cache_hits']))
+    logger.info('Lessons done: {} / {} in {:.0f}s'.format(
+        summary['lessons_done'], summary['total_lessons'], summary['elapsed']))
+    if summary['eta'] is not None:
+        logger.info('ETA: {:.0f}s'.format(summary['eta']))
+    logger.info('Slowest lessons:')
+    for lesson in summary['slowest_lessons']:
+        logger.info('  {:8.2f}s  {}'.format(lesson['duration'], lesson['url']))
+    logger.info('Fetches by host:')
+    for host, stats in sorted(summary['hosts'].items()):
+        logger.info('  {:<40} {:>6} fetches  avg {:.3f}s'.format(host, stats['fetches'], stats['avg_duration']))
+    logger.info('Items by stage:')
+    for event, stats in sorted(summary['items'].items()):
+        logger.info('  {:<22} {:>6} items  {:>5} failed  {:9.2f}s'.format(
+            event, stats['count'], stats['failed'], stats['total_duration']))
+
+
+
+# JSON TREE FILES
+################################################################################
+# The intermediate trees `web_resource_tree` and `ricecooker_json_tree` can be
+# stored in one of the formats in TREE_FORMATS:
+#   - `json`: the whole tree as an indented json document (easy to edit by hand)
+#   - `jsonl`: one compact json record per line, for each node in depth-first
+#     order, with the node's `children` list left empty and two extra keys:
+#     `_id` (int) and `_parent` (the `_id` of the parent node, or null for root)
+#   - `jsonl.gz`: same as `jsonl` but gzip-compressed
+# The `jsonl` formats can be written and read one node at a time.
+
+def json_tree_path(name, tree_format='json'):
+    return os.path.join(DATA_DIR, name + '.' + tree_format)
+
+def find_json_tree_path(name, tree_format='json'):
+    """
+    Returns the path of the file for the tree `name` in the format `tree_format`.
+    Files of the tree in other formats are never read, pass the `--tree-format`
+    the tree was written with.
+    """
+    path = json_tree_path(name, tree_format)
+    if not os.path.exists(path):
+        other_paths = [json_tree_path(name, other_format) for other_format in TREE_FORMATS
+                       if other_format != tree_format]
+        other_paths = [other_path for other_path in other_paths if os.path.exists(other_path)]
+        message = 'No json tree file ' + path + ' found'
+        if other_paths:
+            message += ' (found ' + ', '.join(other_paths) + ', use the matching --tree-format)'
+        raise FileNotFoundError(message)
+    return path
+
+def _open_tree_file(path, mode):
+    if path.endswith('.gz'):
+        return gzip.open(path, mode + 't', encoding='utf8')
+    return open(path, mode, encoding='utf8')
+
+def iter_tree_records(json_tree):
+    """
+    Yields flat node records (see `jsonl` format above) for the nested `json_tree`.
+    """
+    next_id = 0
+    stack = [(json_tree, None)]
+    while stack:
+        node, parent_id = stack.pop()
+        record = dict(node)
+        if 'children' in record:
+            record['children'] = []
+        record['_id'] = next_id
+        record['_parent'] = parent_id
+        yield record
+        for child in reversed(node.get('children', [])):
+            stack.append((child, next_id))
+        next_id += 1
+
+def iter_json_tree_records(name, tree_format='json'):
+    """
+    Yields the flat node records of the tree `name` in depth-first order.
+    Files in the `jsonl` formats are read one line at a time.
+    """
+    return iter_json_tree_file_records(find_json_tree_path(name, tree_format))
+
+def iter_json_tree_file_records(path):
+    if path.endswith('.json'):
+        with open(path) as json_file:
+            json_tree = json.load(json_file)
+        for record in iter_tree_records(json_tree):
+            yield record
+    else:
+        with _open_tree_file(path, 'r') as jsonl_file:
+            for line in jsonl_file:
+                yield json.loads(line)
+
+def read_json_tree(name, tree_format='json'):
+    """
+    Returns the tree `name` stored in the format `tree_format` as a nested dict.
+    """
+    return read_json_tree_file(find_json_tree_path(name, tree_format))
+
+def read_json_tree_file(path):
+    if path.endswith('.json'):
+        with open(path) as json_file:
+            return json.load(json_file)
+    root = None
+    parents = {}
+    for record in iter_json_tree_file_records(path):
+        node_id = record.pop('_id')
+        parent_id = record.pop('_parent')
+        if parent_id is None:
+            root = record
+        else:
+            parents[parent_id]['children'].append(record)
+        if 'children' in record:
+            parents[node_id] = record
+    return root
+
+def write_json_tree(json_tree, name, tree_format='json'):
+    """
+    Write the tree `name` to DATA_DIR in the format `tree_format`.
+    Returns the path of the file written.
+    """
+    path = json_tree_path(name, tree_format)
+    if tree_format == 'json':
+        with open(path, 'w') as json_file:
+            json.dump(json_tree, json_file, indent=2)
+    else:
+        with _open_tree_file(path, 'w') as jsonl_file:
+            for record in iter_tree_records(json_tree):
+                jsonl_file.write(json.dumps(record, separators=(',', ':')) + '\n')
+    return path
+
+
+
+# MEMORY BUDGET
+################################################################################
+# With `--max-rss-mb N` the scrape checks the peak resident memory of the process
+# after each lesson, and stops if it goes over N megabytes, so that memory
+# regressions show up on our small CI containers instead of as OOM kills.
+_MAX_RSS_MB = None
+
+def set_memory_budget(max_rss_mb):
+    global _MAX_RSS_MB
+    _MAX_RSS_MB = max_rss_mb
+
+def get_peak_rss_mb():
+    import resource
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == 'darwin':
+        return peak_rss / 1024 / 1024   # bytes on macOS
+    return peak_rss / 1024              # kilobytes on Linux
+
+def check_memory_budget():
+    if _MAX_RSS_MB is None:
+        return
+    peak_rss_mb = get_peak_rss_mb()
+    if peak_rss_mb > _MAX_RSS_MB:
+        logger.critical('Peak RSS {:.0f} MB is over the budget of {} MB'.format(peak_rss_mb, _MAX_RSS_MB))
+        raise MemoryError('Peak RSS over the --max-rss-mb budget.')
+
+def free_doc(doc):
+    """
+    Free the parsed page `doc` right away instead of at the next garbage collection.
+    `BeautifulSoup.decompose()` only clears the soup object itself (its
+    `next_element` is None), so we break the parent<->child reference cycles of
+    every element in the page, and the soup<->builder cycle.
+    """
+    for element in list(doc.descendants):
+        element.__dict__.clear()
+    doc.__dict__.clear()
 
 
 
 # PART 1: CRAWLING
 ################################################################################
 
+# request headers to refetch a page and update its cached copy, since the session
+# caches the pages forever (used for the listings, which change when lessons are added)
+FRESH_HEADERS = {'Cache-Control': 'no-cache'}
+
 def get_lang_paths():
     """
     Retrieve all video listings for each language.
     Retruns a list of tuples of the form:
         (lang, path)
     """
-    resp = SESSION.get(BASE_URL+VIDEOS_BY_LANGUAGE_PATH)
+    resp = get_session().get(BASE_URL+VIDEOS_BY_LANGUAGE_PATH, headers=FRESH_HEADERS)
     doc = BeautifulSoup(resp.content, 'html.parser')
     main_div = doc.find("div", {"id": "main"})
     videos_ul = main_div.find('div', {'class': 'item-list'}).find_next('ul')
@@ -145,52 +650,95 @@ def get_lang_paths():
         lang_paths.append((li.find('a').text.strip(), li.find('a')['href']))
     return lang_paths
 
-def get_all_lessons_info(listing_url):
+# only parse the listing table and the pager links of by-language listing pages
+LISTING_STRAINER = SoupStrainer(['div', 'ul'], attrs={'class': ['view-content', 'pager']})
+
+def _parse_listing_page(listing_url):
+    """
+    Fetch (bypassing the cache) and parse the listing table and pager of a
+    by-language listing page.
+    Returns a tuple `(video_lessons, page_urls)`, where `video_lessons` is a
+    list of lesson dicts and `page_urls` are the urls of the pager links.
+    """
+    resp = get_session().get(listing_url, headers=FRESH_HEADERS)
+    doc = BeautifulSoup(resp.content, 'html.parser', parse_only=LISTING_STRAINER)
+
+    video_lessons = []
+    view_table = None
+    for view_content in doc.find_all('div', {'class': 'view-content'}):
+        view_table = view_content.find('table')
+        if view_table is not None:
+            break
+    for video_td in view_table.find_all('td') if view_table else []:
+        # single pass over the fields of each <td>
+        topic, title_link = None, None
+        for field_div in video_td.find_all('div'):
+            field_classes = field_div.get('class') or []
+            if 'views-field-field-topic-value' in field_classes:
+                topic_h4 = field_div.find('h4')
+                topic = topic_h4.text if topic_h4 is not None else None
+            elif 'views-field-title' in field_classes:
+                title_link = field_div.find('a')
+        # skip empty <td>s (e.g. last td when there is an odd number of items)
+        if title_link is None:
+            continue
+        video_lessons.append(dict(
+            topic=topic,
+            title=title_link.text,
+            url=BASE_URL + title_link['href'],
+        ))
+
+    page_urls = []
+    for pager_ul in doc.find_all('ul', {'class': 'pager'}):
+        for link in pager_ul.find_all('a', href=True):
+            page_url = urljoin(listing_url, link['href'])
+            if page_url != listing_url and page_url not in page_urls:
+                page_urls.append(page_url)
+    free_doc(doc)
+    return video_lessons, page_urls
+
+def get_all_lessons_info(listing_url, max_workers=PRECHECK_WORKERS):
     """
-    Retrieve all video lessons from a listing url.
-    Returns a list of dicts:
+    Retrieve all video lessons from a listing url. If the listing spans several
+    pages, the pages linked from the pagers are fetched concurrently, one round
+    at a time, until no new pages are found (the pager only links the pages
+    near the current one). Lessons listed on several pages are yielded once,
+    and lessons without a topic are skipped.
+    Yields dicts:
         {   topic:
             title:
             url:           }
     """
-    resp = SESSION.get(listing_url)
-    doc = BeautifulSoup(resp.content, 'html.parser')
-    main_div = doc.find('div', {'id': 'main'})
-    view_content = main_div.find('div', {'class': 'view-content'})
-    view_table = view_content.find('table')
-    video_tds_raw = view_table.find_all('td')
-
-    # skip empty <td>s (e.g. last td when there is an odd number of items)
-    video_tds = []
-    for video_td in video_tds_raw:
-        title = video_td.find('div', {'class':"views-field-title"})
-        if title is not None:
-            video_tds.append(video_td)
-
-    # extract useful info from each td
-    video_lessons = []
-    for video_td in video_tds:
-        topic = video_td.find('div', {'class':"views-field-field-topic-value"}).find('h4').text
-        title_div = video_td.find('div', {'class':"views-field-title"})
-        lesson_path = title_div.find('a')['href']
-        lesson_title = title_div.find('a').text
-
-        lesson = {}
-        lesson['topic'] = topic
-        lesson['title'] = lesson_title
-        lesson['url'] = BASE_URL + lesson_path
-
-        video_lessons.append(lesson)
-
-    return video_lessons
+    seen_page_urls = set([listing_url])
+    seen_lesson_urls = set()
+    page_urls = [listing_url]
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        while page_urls:
+            next_page_urls = []
+            for page_lessons, pager_urls in executor.map(_parse_listing_page, page_urls):
+                for lesson in page_lessons:
+                    if lesson['url'] in seen_lesson_urls:
+                        continue
+                    seen_lesson_urls.add(lesson['url'])
+                    if lesson['topic'] is None:
+                        logger.warning('Skipping lesson without a topic ' + lesson['url'])
+                        continue
+                    yield lesson
+                for page_url in pager_urls:
+                    if page_url not in seen_page_urls:
+                        seen_page_urls.add(page_url)
+                        next_page_urls.append(page_url)
+            page_urls = next_page_urls
 
 def group_lesson_by_topic(video_lessons):
     """
     Given a list of video lesson json objects,
     return a list of dicts, where each dict corresponds to videos for a given topic.
+    Lessons without a topic are left out.
     """
     # 1. sort topics alphabetically
-    video_lessons = sorted(video_lessons, key=lambda vl: vl['topic'])
+    video_lessons = sorted((vl for vl in video_lessons if vl['topic'] is not None),
+                           key=lambda vl: vl['topic'])
 
     # 2. group videos by category
     topics_list = []
@@ -254,13 +802,13 @@ def build_preliminary_tree(languages=None):
 
 ################################################################################
 
-def retrieve_topic_clusters(lesson_url):
+def retrieve_topic_clusters(lesson_url, fresh=False):
     """
-    Retrieves topic clusters for a given video lesson.
+    Retrieves topic clusters for a given video lesson, bypassing the cache if `fresh`.
 
     Returns a list of strings or None.
     """
-    resp = SESSION.get(lesson_url)
+    resp = get_session().get(lesson_url, headers=FRESH_HEADERS if fresh else None)
     doc = BeautifulSoup(resp.content, 'html.parser')
     cluster_p = doc.find('p', {'class': 'cluster-lesson-page-display'})
     if cluster_p is None:
@@ -284,10 +832,47 @@ def get_or_create_cluster(parent, cluster_name):
         parent['children'].append(cluster_node)
     return cluster_node
 
-def add_topic_cluster_membership(web_resource_tree):
+def index_crawled_lessons(web_resource_tree):
+    """
+    Returns a dict keyed by canonical lesson url with the listing entries
+    `(topic, title)` of each lesson in `web_resource_tree`, and the topic clusters
+    it belongs to (None for lessons not in any cluster):
+        {   url: {  entries: set()
+                    clusters: []    }   }
+    """
+    crawled_lessons = {}
+    for lang_node in web_resource_tree['children']:
+        for topic_node in lang_node['children']:
+            for child in topic_node['children']:
+                if child['__class__'] == 'MitBlossomsTopicCluster':
+                    lesson_nodes, cluster_name = child['children'], child['title']
+                else:
+                    lesson_nodes, cluster_name = [child], None
+                for lesson_node in lesson_nodes:
+                    if 'title' not in lesson_node:
+                        continue
+                    lesson = crawled_lessons.setdefault(canonical_lesson_url(lesson_node['url']),
+                                                        dict(entries=set(), clusters=None))
+                    lesson['entries'].add((topic_node['title'], lesson_node['title']))
+                    if cluster_name is not None:
+                        if lesson['clusters'] is None:
+                            lesson['clusters'] = []
+                        if cluster_name not in lesson['clusters']:
+                            lesson['clusters'].append(cluster_name)
+    return crawled_lessons
+
+def add_topic_cluster_membership(web_resource_tree, previous_lessons=None):
     """
-    Retrieve topic-cluster membership for each video and rewrite web_resource_tree
+    Retrieve topic-cluster membership for each video and rewrite web_resource_tree.
+    If `previous_lessons` from the last crawl are given (see `index_crawled_lessons`),
+    the lesson pages are only fetched (bypassing the cache) for new lessons and
+    for lessons whose topic or title changed in the listings. The others keep
+    their clusters.
     """
+    clusters_by_url = {}   # the same lesson appears in the listings of many languages
+    previous_lessons = previous_lessons or {}
+    listed_lessons = index_crawled_lessons(web_resource_tree)
+    num_fetched = 0
     for lang_node in web_resource_tree['children']:
         for topic_node in lang_node['children']:
             logger.info('Processing topic ' + topic_node['title'])
@@ -300,7 +885,16 @@ def add_topic_cluster_membership(web_resource_tree):
                 if 'title' not in lesson_node:
                     continue
                 logger.info("Processing lesson " + lesson_node['title'])
-                topic_clusters = retrieve_topic_clusters(lesson_node['url'])
+                lesson_url = canonical_lesson_url(lesson_node['url'])
+                if lesson_url not in clusters_by_url:
+                    previous = previous_lessons.get(lesson_url)
+                    if previous and listed_lessons[lesson_url]['entries'] <= previous['entries']:
+                        clusters_by_url[lesson_url] = previous['clusters']
+                    else:
+                        clusters_by_url[lesson_url] = retrieve_topic_clusters(lesson_node['url'],
+                                                                              fresh=bool(previous_lessons))
+                        num_fetched += 1
+                topic_clusters = clusters_by_url[lesson_url]
                 if topic_clusters is None:
                     topic_node['children'].append(lesson_node)
                 else:
@@ -318,19 +912,70 @@ def add_topic_cluster_membership(web_resource_tree):
                     return 11 # everything else later
             topic_node['children'] = sorted(topic_node['children'], key=clusters_first)
 
+    logger.info('Fetched topic clusters for {} lessons, reused them for {} lessons'.format(
+        num_fetched, len(clusters_by_url) - num_fetched))
     return web_resource_tree
 
 
+def canonical_lesson_url(url):
+    return url.rstrip('/').replace('http://', 'https://', 1)
+
+def build_lesson_index(web_resource_tree):
+    """
+    Returns a dict keyed by canonical lesson url that records which languages,
+    topics, and topic clusters list each lesson:
+        {   url: {  title:
+                    languages: []
+                    topics: []
+                    clusters: []    }   }
+    """
+    lesson_index = {}
+    def _add_lessons(web_node, lang, topic, cluster):
+        for child in web_node['children']:
+            if child['__class__'] == 'MitBlossomsTopicCluster':
+                _add_lessons(child, lang, topic, child['title'])
+                continue
+            entry = lesson_index.setdefault(canonical_lesson_url(child['url']), dict(
+                title=child['title'], languages=[], topics=[], clusters=[],
+            ))
+            for key, value in [('languages', lang), ('topics', topic), ('clusters', cluster)]:
+                if value is not None and value not in entry[key]:
+                    entry[key].append(value)
+    for lang_node in web_resource_tree['children']:
+        for topic_node in lang_node['children']:
+            _add_lessons(topic_node, lang_node['lang'], topic_node['title'], None)
+    return lesson_index
+
+def load_lesson_index():
+    """
+    Returns the lesson index written by the crawl, or None if there isn't one.
+    """
+    if not os.path.exists(LESSON_INDEX):
+        return None
+    with open(LESSON_INDEX) as index_file:
+        return json.load(index_file)
+
 def crawling_part(args, options):
     """
     Main function for PART 1: CRAWLING.
+    The listings are always fetched from the site (see FRESH_HEADERS). Unless
+    args['full_crawl'] is True, the topic clusters of the lessons that haven't
+    changed are taken from the previous DATA_DIR/web_resource_tree.json
     """
+    previous_lessons = None
+    if not args['full_crawl']:
+        try:
+            previous_lessons = index_crawled_lessons(read_json_tree('web_resource_tree', args['tree_format']))
+        except FileNotFoundError:
+            logger.info('No previous web_resource_tree found, crawling all lessons')
     web_resource_tree = build_preliminary_tree(languages=args['languages'])
-    web_resource_tree = add_topic_cluster_membership(web_resource_tree)
-    json_file_name = os.path.join(DATA_DIR, 'web_resource_tree.json')
-    with open(json_file_name, 'w') as json_file:
-        json.dump(web_resource_tree, json_file, indent=2)
-    logger.info('Intermediate result stored in' + json_file_name)
+    web_resource_tree = add_topic_cluster_membership(web_resource_tree, previous_lessons)
+    json_file_name = write_json_tree(web_resource_tree, 'web_resource_tree', args['tree_format'])
+    logger.info('Intermediate result stored in ' + json_file_name)
+    lesson_index = build_lesson_index(web_resource_tree)
+    with open(LESSON_INDEX, 'w') as index_file:
+        json.dump(lesson_index, index_file, indent=2, sort_keys=True)
+    logger.info('Lesson index of ' + str(len(lesson_index)) + ' unique lessons stored in ' + LESSON_INDEX)
     logger.info('Crawling part finished.\n')
 
 
@@ -345,22 +990,36 @@ def get_cloudfront_video_url(lang_video_url):
     Returns None if no mp4 file is found.
     """
     # PART 1: Open the language specific video player page on MIT Blossoms
-    resp1 = SESSION.get(lang_video_url)
+    resp1 = get_session().get(lang_video_url)
     lang_video_doc = BeautifulSoup(resp1.content, 'html.parser')
     player_div = lang_video_doc.find('div', {'class':"video-embeddedplayer"})
     embed_url = player_div.find('iframe')['src']
+    free_doc(lang_video_doc)
 
     # PART 2: Open the iframe that contains the actual link to the mp4 file
-    resp2 = SESSION.get(embed_url)
+    resp2 = get_session().get(embed_url)
     embed_doc = BeautifulSoup(resp2.content, 'html.parser')
     player = embed_doc.find('div', {'class': 'video-player'})
+    video_url = None
     if player:
         video_url = player.find('source', {'type':'video/mp4'})['src']
         if video_url.startswith('//'):   # since CDN URLs don't include protocol
             video_url = 'http:' + video_url
-        return video_url
-    else:
-        return None
+    free_doc(embed_doc)
+    return video_url
+
+
+ADDITIONAL_RESOURCES_PAGE_START = """<!DOCTYPE html>
+<html>
+  <head>
+    <meta charset="utf-8">
+    <title></title>
+  </head>
+  <body>
+"""
+ADDITIONAL_RESOURCES_PAGE_END = """
+  </body>
+</html>"""
 
 
 class MitBlossomsVideoLessonResource(object):
@@ -375,8 +1034,10 @@ class MitBlossomsVideoLessonResource(object):
         assert data['__class__'] == 'MitBlossomsVideoLessonResource'
         self.url = data['url']
         self.title = data['title']
-        resp = SESSION.get(self.url)
+        resp = get_session().get(self.url)
         self.doc = BeautifulSoup(resp.content, 'html.parser')
+        self._video_urls = None       # cached results of get_video_urls
+        self._video_urls_alt = None   # cached results of get_video_urls_alt
 
 
     # METADATA #################################################################
@@ -456,33 +1117,28 @@ class MitBlossomsVideoLessonResource(object):
         for link in all_links:
             anchor_text = link.get_text().strip()
             link.replaceWith(anchor_text)
+            link.decompose()
 
-        # create a temp directory to house the index.html and other files
-        destpath = tempfile.mkdtemp(dir=ZIP_FILES_TMP_DIR)
-
-        # create an index.html with the content from the "Additional Resources" tab
-        basic_page_str = """
-        <!DOCTYPE html>
-        <html>
-          <head>
-            <meta charset="utf-8">
-            <title></title>
-          </head>
-          <body>
-          </body>
-        </html>"""
-        basic_page = BeautifulSoup(basic_page_str, "html.parser")
-        body = basic_page.find('body')
-        body.append(inner_block_div)
-        with open(os.path.join(destpath, 'index.html'), 'w', encoding="utf8") as index_html:
-            index_html.write(str(basic_page))
+        # write an index.html with the content from the "Additional Resources"
+        # tab straight into the zip file (named after the lesson so it's repeatable)
         # Note: none of the "Additional Resources" tabs include any images,
         #       i.e., inner_block_div.find_all("img") == []
-        # turn the temp folder into a zip file
-        zippath = create_predictable_zip(destpath)
+        from ricecooker.utils.zip import write_file_to_zip_with_neutral_metadata
+        index_html = ADDITIONAL_RESOURCES_PAGE_START + str(inner_block_div) + ADDITIONAL_RESOURCES_PAGE_END
+        zippath = os.path.join(ZIP_FILES_TMP_DIR, self.get_source_id() + '-additional_resources.zip')
+        with zipfile.ZipFile(zippath, 'w', compression=zipfile.ZIP_DEFLATED) as zfile:
+            write_file_to_zip_with_neutral_metadata(zfile, 'index.html', index_html)
 
         return zippath
 
+    def close(self):
+        """
+        Free the lesson page DOM once all the data has been extracted.
+        """
+        if self.doc is not None:
+            free_doc(self.doc)
+            self.doc = None
+
 
     def get_transcripts(self):
         """
@@ -513,6 +1169,8 @@ class MitBlossomsVideoLessonResource(object):
 
         Returns a list of tuples: (lang_variant, url).
         """
+        if self._video_urls is not None:
+            return self._video_urls
         videos_ul = self.doc.find('ul', {'class':"lesson-playvideo-block"})
         video_lis = videos_ul.find_all('li', {'class':"lesson-playvideo-item"})
         video_links = []
@@ -532,6 +1190,7 @@ class MitBlossomsVideoLessonResource(object):
             else:
                 pass
 
+        self._video_urls = lang_url_tuples
         return lang_url_tuples
 
     def get_video_urls_alt(self):
@@ -543,6 +1202,8 @@ class MitBlossomsVideoLessonResource(object):
 
         Returns a list of tuples: (lang_variant, url).
         """
+        if self._video_urls_alt is not None:
+            return self._video_urls_alt
         downloads_div = self.doc.find('div', {'id':"lesson-detail-tab-download"})
         videos_table = downloads_div.find('table', {'class':"lesson-downloadvideo-contents"})
         video_tds = videos_table.find_all('tr')
@@ -563,6 +1224,7 @@ class MitBlossomsVideoLessonResource(object):
                 video_format = video_tr.find('td', {'class':"videolist-format"}).text.strip()
                 if video_format == 'MPEG 4':
                     lang_url_tuples.append((video_lang, video_url))
+        self._video_urls_alt = lang_url_tuples
         return lang_url_tuples
 
     def get_video_url_for_lang(self, lang):
@@ -612,11 +1274,24 @@ def _get_child_node_by_title(parent_node, title):
 
 
 # Main beast
-def _build_json_tree(parent_node, sourcetree, languages=None):
-    # type: (dict, List[dict], str) -> None
+def _build_json_tree(parent_node, sourcetree, languages=None, built_lessons=None,
+                     video_downloads=None, lesson_catalog=None):
+    # type: (dict, List[dict], str, dict, VideoDownloadScheduler, dict) -> None
     """
     Parse the web resource nodes given in `sourcetree` and add as children of `parent_node`.
+    All `languages` are resolved for every lesson, since a lesson page can link
+    videos in languages whose listing doesn't include the lesson. Each lesson is scraped once: lesson folders are kept in
+    `built_lessons` by canonical url and copied if the lesson appears again.
+    If `video_downloads` is given, each video url is scheduled for download as
+    soon as it is resolved. If `lesson_catalog` is given, a copy of each lesson
+    folder is added to it by canonical url (see LANGUAGE VARIANTS below), so the
+    overrides and local video paths applied to the tree later stay out of it.
+    The json tree overrides are not applied here, since the nodes are matched
+    by their scraped titles: apply them to the complete tree with `apply_json_tree_overrides`.
     """
+    from le_utils.constants.languages import getlang
+    if built_lessons is None:
+        built_lessons = {}
     EXPECTED_NODE_TYPES = ['MitBlossomsLang', 'MitBlossomsTopic', 'MitBlossomsTopicCluster',
                            'MitBlossomsVideoLessonResource']
     for source_node in sourcetree:
@@ -628,7 +1303,9 @@ def _build_json_tree(parent_node, sourcetree, languages=None):
             # For OPTION E we do not use the top-level split-by language. Instead,
             # we process the children of all languages together in a single topic tree
             source_tree_children = source_node.get("children", [])
-            _build_json_tree(parent_node, source_tree_children, languages=languages)
+            _build_json_tree(parent_node, source_tree_children, languages=languages,
+                             built_lessons=built_lessons, video_downloads=video_downloads,
+                             lesson_catalog=lesson_catalog)
 
         elif kind == 'MitBlossomsTopic':
             child_node = _get_child_node_by_title(parent_node, source_node['title'])
@@ -645,7 +1322,9 @@ def _build_json_tree(parent_node, sourcetree, languages=None):
                 parent_node['children'].append(child_node)
                 logger.info('Created new topic node titled ' + child_node['title'])
             source_tree_children = source_node.get("children", [])
-            _build_json_tree(child_node, source_tree_children, languages=languages)
+            _build_json_tree(child_node, source_tree_children, languages=languages,
+                             built_lessons=built_lessons, video_downloads=video_downloads,
+                             lesson_catalog=lesson_catalog)
 
         elif kind == 'MitBlossomsTopicCluster':
             child_node = _get_child_node_by_title(parent_node, source_node['title'])
@@ -662,12 +1341,20 @@ def _build_json_tree(parent_node, sourcetree, languages=None):
                 parent_node['children'].append(child_node)
                 logger.info('Created new cluster node titled ' + child_node['title'])
             source_tree_children = source_node.get("children", [])
-            _build_json_tree(child_node, source_tree_children, languages=languages)
+            _build_json_tree(child_node, source_tree_children, languages=languages,
+                             built_lessons=built_lessons, video_downloads=video_downloads,
+                             lesson_catalog=lesson_catalog)
 
         elif kind == 'MitBlossomsVideoLessonResource':
             child_node = _get_child_node_by_title(parent_node, source_node['title'])
             if child_node is not None: # This video lesson was already processed
                 continue
+            lesson_url = canonical_lesson_url(source_node['url'])
+            if lesson_url in built_lessons:  # same lesson in another topic or cluster
+                parent_node['children'].append(copy.deepcopy(built_lessons[lesson_url]))
+                continue
+            lesson_start = time.time()
+            emit_event('lesson_started', url=lesson_url, title=source_node['title'])
             lesson = MitBlossomsVideoLessonResource(source_node)
             lesson_authors_joined = ','.join(lesson.get_teachers())
             lesson_folder = dict(
@@ -679,13 +1366,19 @@ def _build_json_tree(parent_node, sourcetree, languages=None):
                 author=lesson_authors_joined,
                 description=lesson.get_video_summary(),
                 thumbnail=lesson.get_thumbnail_url(),
+                source_url=lesson.url,
                 children=[],
             )
             parent_node['children'].append(lesson_folder)
+            built_lessons[lesson_url] = lesson_folder
 
             # 1. Add the `VideoNode`s
+            video_source_ids = {}   # lang --> source_id of the video for that language
             for lang in languages:
+                video_start = time.time()
                 lang_variant, video_url = lesson.get_video_url_for_lang(lang)
+                emit_event('video_resolved', url=lesson_url, lang=lang, lang_variant=lang_variant,
+                           found=video_url is not None, duration=round(time.time() - video_start, 3))
                 if video_url is None:
                     logger.debug('No video_url found for ' + lang + ' in ' + lesson.url)
                     continue
@@ -693,6 +1386,7 @@ def _build_json_tree(parent_node, sourcetree, languages=None):
                     node_id=lesson.get_source_id(),
                     lang_variant=lang_variant
                 )
+                video_source_ids[lang] = source_id
                 video_grandchild = dict(
                     kind='VideoNode',
                     source_id=source_id,
@@ -702,7 +1396,7 @@ def _build_json_tree(parent_node, sourcetree, languages=None):
                     ),
                     author=lesson_authors_joined,
                     description=lesson.get_video_summary(),
-                    language=constants.languages.getlang(LANGUAGE_LOOKUP[lang]).code, # test path with Language object's code
+                    language=getlang(LANGUAGE_LOOKUP[lang]).code, # test path with Language object's code
                     derive_thumbnail=True,
                     thumbnail=lesson.get_thumbnail_url(),
                 )
@@ -723,6 +1417,8 @@ def _build_json_tree(parent_node, sourcetree, languages=None):
                         language=LANGUAGE_LOOKUP[lang],  # test path with str code
                     )
                     video_grandchild['files'] = [video_file]
+                    if video_downloads is not None:
+                        video_downloads.schedule(video_url)
 
             # 2. Add the lesson transcript(s)
             video_transcripts = lesson.get_transcripts()
@@ -814,7 +1510,14 @@ def _build_json_tree(parent_node, sourcetree, languages=None):
                         # language=lang, # TODO   Ask how to use le_util.languages ???
                     )
                     document_node['files']=[document_file]
+            if lesson_catalog is not None:
+                lesson_catalog[lesson_url] = dict(folder=copy.deepcopy(lesson_folder), videos=dict(video_source_ids))
+            lesson.close()
             logger.info('Created new lesson node ' + lesson.title)
+            check_memory_budget()
+            num_videos = len([n for n in lesson_folder['children'] if n['kind'] == 'VideoNode'])
+            emit_event('lesson_finished', url=lesson_url, title=lesson.title, num_videos=num_videos,
+                       duration=round(time.time() - lesson_start, 3))
         else:
             logger.critical("Encountered an unknown content node format.")
             continue
@@ -827,43 +1530,61 @@ def scraping_part(args, options):
     Main function for PART 2:
       - Reads result of crawl from DATA_DIR/web_resource_tree.json
       - Scrapes content from each video lesson
+      - Applies the manual content fixes from DATA_DIR/json_tree_overrides.json
       - Writes ricecooker-ready json to DATA_DIR/ricecooker_json_tree.json
-    If args['pruned'] is True, the tree is pruned to leave a few nodes for testing.
+    If args['pruned'] is True, only a sample of the lessons is scraped for testing.
+    If args['prefetch_videos'] is True, the videos are downloaded during the scrape.
     """
     # Read in web_resource_tree.json
-    web_resource_tree = None
-    with open(os.path.join(DATA_DIR, 'web_resource_tree.json')) as json_file:
-        web_resource_tree = json.load(json_file)
+    web_resource_tree = read_json_tree('web_resource_tree', args['tree_format'])
     assert web_resource_tree['__class__'] == 'MitBlossomsResourceTree'
 
+    # For testing only: keep a few lessons per topic and cluster before scraping
+    if args['pruned']:
+        web_resource_tree = sample_web_resource_tree(web_resource_tree, sample_size=args['sample_size'],
+                                                     seed=args['sample_seed'])
+
     # For testing only: give the pruned test channel a different `source_id`
     if args['pruned']:
         source_id_suffix = '-pruned'
     else:
         source_id_suffix = ''
 
+    lesson_index = load_lesson_index()
+    if args['pruned'] or lesson_index is None:
+        total_lessons = len(build_lesson_index(web_resource_tree))
+    else:
+        total_lessons = len(lesson_index)
+    emit_event('scrape_started', total_lessons=total_lessons)
+
+    # Download the videos in the background while we scrape
+    video_downloads = None
+    if args['prefetch_videos']:
+        video_downloads = VideoDownloadScheduler(max_workers=args['video_workers'])
+
     # Ricecooker tree
     ricecooker_json_tree = dict(
         kind='ChannelNode',
         children=[],
     )
-    _build_json_tree(ricecooker_json_tree, web_resource_tree['children'], languages=args['languages'])
+    lesson_catalog = {}
+    _build_json_tree(ricecooker_json_tree, web_resource_tree['children'], languages=args['languages'],
+                     video_downloads=video_downloads, lesson_catalog=lesson_catalog)
+    apply_json_tree_overrides(ricecooker_json_tree, load_json_tree_overrides())
 
-    # Write out ricecooker_json_tree.json
-    json_file_name = os.path.join(DATA_DIR, 'ricecooker_json_tree.json')
-    with open(json_file_name, 'w') as json_file:
-        json.dump(ricecooker_json_tree, json_file, indent=2)
+    if video_downloads is not None:
+        logger.info('Waiting for video downloads to finish')
+        num_videos = localize_videos(ricecooker_json_tree, video_downloads.join())
+        logger.info('Using ' + str(num_videos) + ' videos downloaded to ' + VIDEOS_DIR)
 
-    # Prune the content tree to leave only a few lessons (used for testing)
-    if args['pruned']:
-        original_tree_path = os.path.join(DATA_DIR, 'ricecooker_json_tree.json')
-        full_tree_path = os.path.join(DATA_DIR, 'ricecooker_json_tree_full.json')
-        pruned_tree_path = os.path.join(DATA_DIR, 'ricecooker_pruned_json_tree.json')
-        shutil.copyfile(original_tree_path, full_tree_path)   # save a backup of the full tree
-        prune_tree_for_testing()                              # produce pruned version
-        shutil.move(pruned_tree_path, original_tree_path)     # replace full with pruned
+    # Write out ricecooker_json_tree.json
+    tree_format = args['tree_format']
+    raise_for_invalid_json_tree(iter_tree_records(ricecooker_json_tree))
+    json_file_name = write_json_tree(ricecooker_json_tree, 'ricecooker_json_tree', tree_format)
+    write_lesson_catalog(lesson_catalog, args['languages'])
 
     logger.info('Intermediate result stored in ' + json_file_name)
+    logger.info('Peak RSS {:.0f} MB'.format(get_peak_rss_mb()))
     logger.info('Scraping part finished.\n')
 
 
@@ -896,150 +1617,1241 @@ def _find_and_replace_in_node(node, match, update):
         for child in node['children']:
             _find_and_replace_in_node(child, match, update)
 
-def apply_json_tree_overrides():
+# keys that identify nodes in the json tree: the lessons and topics are deduplicated by
+# title, and patched (PART 2: PARTIAL RE-SCRAPE) and diffed by source_id
+JSON_TREE_OVERRIDES_PROTECTED_KEYS = ['kind', 'source_id', 'title', 'children']
+
+def load_json_tree_overrides(tree_overrides_filename=None):
     """
-    Apply manual content fixes from `chefdata/json_tree_overrides.json`.
+    Returns the manual content fixes from `chefdata/json_tree_overrides.json`.
+    Raises ValueError if a fix updates one of JSON_TREE_OVERRIDES_PROTECTED_KEYS.
     """
-    json_tree_filename = os.path.join(DATA_DIR, 'ricecooker_json_tree.json')
-    json_tree = None
-    with open(json_tree_filename) as json_file:
-        json_tree = json.load(json_file)
-
-    tree_overrides_filename = os.path.join(DATA_DIR, 'json_tree_overrides.json')
+    if tree_overrides_filename is None:
+        tree_overrides_filename = os.path.join(DATA_DIR, 'json_tree_overrides.json')
     with open(tree_overrides_filename) as overrides_file:
         tree_overrides = json.load(overrides_file)
-        for fix in tree_overrides:
-            match_criteria = fix['match']
-            update_data = fix['update']
-            _find_and_replace_in_node(json_tree, match_criteria, update_data)
+    for fix in tree_overrides:
+        protected_keys = [key for key in fix['update'] if key in JSON_TREE_OVERRIDES_PROTECTED_KEYS]
+        if protected_keys:
+            raise ValueError('The override for {} in {} cannot update {}'.format(
+                json.dumps(fix['match']), tree_overrides_filename, ', '.join(protected_keys)))
+    return tree_overrides
+
+def apply_json_tree_overrides(node, tree_overrides):
+    """
+    Apply the manual content fixes `tree_overrides` to the json tree `node`.
+    """
+    for fix in tree_overrides:
+        match_criteria = fix['match']
+        update_data = fix['update']
+        _find_and_replace_in_node(node, match_criteria, update_data)
 
-    # Write out ricecooker_json_tree.json
-    with open(json_tree_filename, 'w') as json_file:
-        json.dump(json_tree, json_file, indent=2)
 
 
 
-# HELPER FUNCTION FOR TESTING
+# PART 2: PARTIAL RE-SCRAPE
 ################################################################################
+# Re-scrape only some lessons (--only-lesson) or topics (--only-topic) and patch
+# the results into the existing ricecooker_json_tree. Topic-level nodes are
+# identified by the source_id prefixes in BLOSSOMS_FMT.
+TOPIC_SOURCE_ID_PREFIXES = (
+    BLOSSOMS_FMT['topic']['source_id'].format(title=''),
+    BLOSSOMS_FMT['cluster']['source_id'].format(title=''),
+)
+
+def _iter_lesson_folders(node):
+    for child in node.get('children', []):
+        if child['kind'] != 'TopicNode':
+            continue
+        if child['source_id'].startswith(TOPIC_SOURCE_ID_PREFIXES):
+            for lesson_folder in _iter_lesson_folders(child):
+                yield lesson_folder
+        else:
+            yield child
 
-def prune_tree_for_testing():
-    ricecooker_json_tree = None
-    with open(os.path.join(DATA_DIR,'ricecooker_json_tree.json')) as infile:
-        ricecooker_json_tree = json.load(infile)
+def _iter_web_lessons(web_node):
+    for child in web_node.get('children', []):
+        if child['__class__'] == 'MitBlossomsVideoLessonResource':
+            yield child
+        else:
+            for lesson_node in _iter_web_lessons(child):
+                yield lesson_node
 
-    pruned_tree = ricecooker_json_tree.copy()
-    pruned_tree['children']=[]
+def resolve_lesson_urls(lesson_specs, web_resource_tree, json_tree):
+    """
+    Returns the set of normalized lesson urls for the `--only-lesson` values,
+    which can be lesson urls or lesson node ids like `node-7647`.
+    """
+    urls_by_node_id = {}
+    for lesson_folder in _iter_lesson_folders(json_tree):
+        if 'source_url' in lesson_folder:
+            urls_by_node_id[lesson_folder['source_id']] = canonical_lesson_url(lesson_folder['source_url'])
+
+    lesson_urls = set()
+    unresolved_node_ids = set()
+    for spec in lesson_specs:
+        if spec.startswith('http'):
+            lesson_urls.add(canonical_lesson_url(spec))
+        elif spec in urls_by_node_id:
+            lesson_urls.add(urls_by_node_id[spec])
+        else:
+            unresolved_node_ids.add(spec)
+
+    # fall back to looking at the (cached) lesson pages to find the node ids,
+    # once for each lesson (lessons are listed under many languages and clusters)
+    if unresolved_node_ids:
+        seen_urls = set()
+        for lesson_node in _iter_web_lessons(web_resource_tree):
+            lesson_url = canonical_lesson_url(lesson_node['url'])
+            if lesson_url in seen_urls:
+                continue
+            seen_urls.add(lesson_url)
+            lesson = MitBlossomsVideoLessonResource(lesson_node)
+            node_id = lesson.get_source_id()
+            lesson.close()
+            if node_id in unresolved_node_ids:
+                unresolved_node_ids.remove(node_id)
+                lesson_urls.add(lesson_url)
+            if not unresolved_node_ids:
+                break
+    for node_id in unresolved_node_ids:
+        logger.warning('Could not find lesson ' + node_id + ' in web_resource_tree')
+    return lesson_urls
+
+def filter_web_resource_tree(web_node, lesson_urls, topic_titles):
+    """
+    Returns a copy of `web_node` that keeps only the lessons in `lesson_urls`
+    and the topics or clusters with titles in `topic_titles` (with all lessons).
+    Returns None if nothing matches.
+    """
+    kind = web_node['__class__']
+    if kind == 'MitBlossomsVideoLessonResource':
+        return web_node if canonical_lesson_url(web_node['url']) in lesson_urls else None
+    if kind in ['MitBlossomsTopic', 'MitBlossomsTopicCluster'] and web_node['title'] in topic_titles:
+        return web_node
+    filtered_children = []
+    for child in web_node.get('children', []):
+        filtered_child = filter_web_resource_tree(child, lesson_urls, topic_titles)
+        if filtered_child is not None:
+            filtered_children.append(filtered_child)
+    if not filtered_children:
+        return None
+    filtered_node = dict(web_node)
+    filtered_node['children'] = filtered_children
+    return filtered_node
 
-    full_first_topic = ricecooker_json_tree['children'][0]
-    pruned_first_topic = full_first_topic.copy()
-    pruned_first_topic['children']=[]
+def _patch_json_tree(parent_node, partial_parent_node, topic_titles):
+    """
+    Patch the nodes from `partial_parent_node` into `parent_node` by `source_id`.
+    Lesson folders and topics in `topic_titles` replace the existing node;
+    other topics are patched recursively.
+    Returns the list of replaced or added nodes.
+    """
+    patched_nodes = []
+    for partial_child in partial_parent_node['children']:
+        existing_indices = [i for i, child in enumerate(parent_node['children'])
+                            if child['source_id'] == partial_child['source_id']]
+        is_topic = partial_child['source_id'].startswith(TOPIC_SOURCE_ID_PREFIXES)
+        if is_topic and partial_child['title'] not in topic_titles and existing_indices:
+            existing_child = parent_node['children'][existing_indices[0]]
+            patched_nodes.extend(_patch_json_tree(existing_child, partial_child, topic_titles))
+        elif existing_indices:
+            for i in existing_indices:
+                parent_node['children'][i] = partial_child
+            patched_nodes.append(partial_child)
+        else:
+            parent_node['children'].append(partial_child)
+            patched_nodes.append(partial_child)
+    return patched_nodes
 
-    full_first_topic_cluster = full_first_topic['children'][0]
-    full_third_topic_cluster = full_first_topic['children'][2]
-    first_non_cluster_lesson = full_first_topic['children'][6]
-    second_non_cluster_lesson = full_first_topic['children'][7]
-    third_non_cluster_lesson = full_first_topic['children'][8]
+def partial_scraping_part(args, options):
+    """
+    Re-scrape only the lessons in args['only_lesson'] and the topics or clusters
+    in args['only_topic'], then patch them into DATA_DIR/ricecooker_json_tree.json
+    with the json tree overrides applied to the re-scraped nodes only.
+    """
+    web_resource_tree = read_json_tree('web_resource_tree', args['tree_format'])
+    json_tree = read_json_tree('ricecooker_json_tree', args['tree_format'])
+    topic_titles = set(args['only_topic'] or [])
+    lesson_urls = resolve_lesson_urls(args['only_lesson'] or [], web_resource_tree, json_tree)
 
-    pruned_first_topic_cluster = full_first_topic_cluster.copy()
-    pruned_first_topic_cluster['children']=[]
-    pruned_second_topic_cluster = full_third_topic_cluster.copy()
-    pruned_second_topic_cluster['children']=[]
+    filtered_web_tree = filter_web_resource_tree(web_resource_tree, lesson_urls, topic_titles)
+    if filtered_web_tree is None:
+        logger.warning('No lessons or topics matched --only-lesson and --only-topic')
+        return
 
-    first_lesson_in_first_cluster = full_first_topic_cluster['children'][0]
-    first_lesson_in_second_cluster = full_third_topic_cluster['children'][0]
+    partial_tree = dict(
+        kind='ChannelNode',
+        children=[],
+    )
+    video_downloads = None
+    if args['prefetch_videos']:
+        video_downloads = VideoDownloadScheduler(max_workers=args['video_workers'])
+    lesson_catalog = {}
+    _build_json_tree(partial_tree, filtered_web_tree['children'], languages=args['languages'],
+                     video_downloads=video_downloads, lesson_catalog=lesson_catalog)
+    apply_json_tree_overrides(partial_tree, load_json_tree_overrides())
+    if video_downloads is not None:
+        localize_videos(partial_tree, video_downloads.join())
+
+    patched_nodes = _patch_json_tree(json_tree, partial_tree, topic_titles)
+    for patched_node in patched_nodes:
+        logger.info('Patched node ' + patched_node['source_id'] + ' ' + patched_node['title'])
+
+    raise_for_invalid_json_tree(iter_tree_records(json_tree))
+    json_file_name = write_json_tree(json_tree, 'ricecooker_json_tree', args['tree_format'])
+    catalog = read_lesson_catalog()
+    if catalog is not None:
+        catalog['lessons'].update(lesson_catalog)
+        write_lesson_catalog(catalog['lessons'], catalog['languages'])
+    logger.info('Intermediate result stored in ' + json_file_name)
+    logger.info('Partial scraping part finished.\n')
 
-    pruned_first_topic_cluster['children']=[first_lesson_in_first_cluster]
-    pruned_second_topic_cluster['children']=[first_lesson_in_second_cluster]
-    pruned_first_topic['children']=[
-        pruned_first_topic_cluster,
-        pruned_second_topic_cluster,
-        first_non_cluster_lesson,
-        second_non_cluster_lesson,
-        third_non_cluster_lesson
-    ]
-    pruned_tree['children']=[pruned_first_topic]
 
-    with open(os.path.join(DATA_DIR, 'ricecooker_pruned_json_tree.json'), 'w') as outfile:
-        json.dump(pruned_tree, outfile, indent=2)
+
+# PART 2b: REMOTE FILES PRECHECK
+################################################################################
+PRECHECK_FILE_TYPES = ['VideoFile', 'DocumentFile']
+
+def _iter_remote_files(node):
+    """
+    Yields `(node, file)` tuples for all the `VideoFile`s and `DocumentFile`s in
+    the json tree `node` whose path is a URL.
+    """
+    for f in node.get('files', []):
+        if f.get('file_type') in PRECHECK_FILE_TYPES and f['path'].startswith('http'):
+            yield node, f
+    for child in node.get('children', []):
+        for node_and_file in _iter_remote_files(child):
+            yield node_and_file
+
+def head_remote_file(url):
+    """
+    Send a HEAD request for `url` and return a manifest entry (dict) with the
+    status code, Content-Length, ETag, and Last-Modified of the remote file.
+    """
+    entry = dict(url=url, status=None, content_length=None, etag=None, last_modified=None)
+    try:
+        resp = get_session().head(url, allow_redirects=True, timeout=PRECHECK_TIMEOUT)
+    except requests.exceptions.RequestException as e:
+        entry['error'] = str(e)
+        entry['ok'] = False
+        return entry
+    entry['status'] = resp.status_code
+    content_length = resp.headers.get('Content-Length')
+    if content_length is not None and content_length.isdigit():
+        entry['content_length'] = int(content_length)
+    entry['etag'] = resp.headers.get('ETag')
+    entry['last_modified'] = resp.headers.get('Last-Modified')
+    entry['ok'] = resp.status_code == 200
+    return entry
+
+def precheck_remote_file(url):
+    start = time.time()
+    entry = head_remote_file(url)
+    emit_event('file_checked', url=url, status=entry['status'], ok=entry['ok'],
+               duration=round(time.time() - start, 3))
+    return entry
+
+def precheck_remote_files(json_tree, max_workers=PRECHECK_WORKERS):
+    """
+    Send concurrent HEAD requests for all remote files in `json_tree`.
+    Returns a list of manifest entries, one for each (node, file) pair.
+    """
+    nodes_and_files = list(_iter_remote_files(json_tree))
+    unique_urls = sorted(set(f['path'] for _, f in nodes_and_files))
+    logger.info('Prechecking ' + str(len(unique_urls)) + ' remote files')
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        entries_by_url = dict(zip(unique_urls, executor.map(precheck_remote_file, unique_urls)))
+    manifest = []
+    for node, f in nodes_and_files:
+        entry = dict(source_id=node['source_id'], kind=node['kind'], file_type=f['file_type'])
+        entry.update(entries_by_url[f['path']])
+        manifest.append(entry)
+    return manifest
+
+def _drop_nodes_with_dead_files(node, dead_urls):
+    """
+    Remove content nodes that have a file in `dead_urls` from the json tree, as
+    well as the TopicNodes that become empty as a result.
+    Returns the number of content nodes removed.
+    """
+    num_dropped = 0
+    kept_children = []
+    for child in node.get('children', []):
+        if any(f['path'] in dead_urls for f in child.get('files', [])):
+            logger.warning('Dropping ' + child['kind'] + ' ' + child['source_id'])
+            num_dropped += 1
+            continue
+        if child['kind'] == 'TopicNode' and child['children']:
+            num_dropped += _drop_nodes_with_dead_files(child, dead_urls)
+            if not child['children']:
+                continue
+        kept_children.append(child)
+    node['children'] = kept_children
+    return num_dropped
+
+def precheck_part(args, options):
+    """
+    Main function for PART 2b: REMOTE FILES PRECHECK.
+      - Reads the json tree from DATA_DIR/ricecooker_json_tree.json
+      - Sends HEAD request for every VideoFile and DocumentFile
+      - Writes the manifest of results to REMOTE_FILES_MANIFEST
+    If args['drop_missing'] is True, nodes with dead links are removed from the tree.
+    """
+    json_tree = read_json_tree('ricecooker_json_tree', args['tree_format'])
+
+    manifest = precheck_remote_files(json_tree, max_workers=args['precheck_workers'])
+    with open(REMOTE_FILES_MANIFEST, 'w') as manifest_file:
+        json.dump(manifest, manifest_file, indent=2)
+
+    dead_urls = set(entry['url'] for entry in manifest if not entry['ok'])
+    for url in sorted(dead_urls):
+        logger.warning('Dead link ' + url)
+
+    # capacity estimate for the download and transcode stage (unique files only)
+    sizes_by_url = {}
+    for entry in manifest:
+        if entry['ok']:
+            sizes_by_url[entry['url']] = entry['content_length'] or 0
+    for file_type in PRECHECK_FILE_TYPES:
+        urls = set(e['url'] for e in manifest if e['ok'] and e['file_type'] == file_type)
+        total_bytes = sum(sizes_by_url[url] for url in urls)
+        logger.info('{} {}s: {:.1f} MB'.format(len(urls), file_type, total_bytes/1024/1024))
+    logger.info('Total download size estimate: {:.1f} MB'.format(sum(sizes_by_url.values())/1024/1024))
+
+    if dead_urls and args['drop_missing']:
+        num_dropped = _drop_nodes_with_dead_files(json_tree, dead_urls)
+        logger.info('Dropped ' + str(num_dropped) + ' nodes with dead links')
+        write_json_tree(json_tree, 'ricecooker_json_tree', args['tree_format'])
+
+    logger.info('Manifest stored in ' + REMOTE_FILES_MANIFEST)
+    logger.info('Precheck part finished.\n')
+
+
+
+# PART 2c: THUMBNAILS
+################################################################################
+# All the nodes in a lesson folder use the same `lesson.get_thumbnail_url()`
+# image, so we download each unique thumbnail once, normalize it to PNG images
+# of THUMBNAIL_SIZE, and store it in THUMBNAILS_DIR by the hash of its content.
+
+def _iter_nodes(node):
+    yield node
+    for child in node.get('children', []):
+        for descendant in _iter_nodes(child):
+            yield descendant
+
+def normalize_thumbnail(image_bytes):
+    """
+    Returns the PNG bytes of the image `image_bytes` scaled to fit in
+    THUMBNAIL_SIZE and centered on a white background of that size.
+    """
+    from io import BytesIO
+    from PIL import Image
+    image = Image.open(BytesIO(image_bytes)).convert('RGB')
+    scale = min(THUMBNAIL_SIZE[0]/image.width, THUMBNAIL_SIZE[1]/image.height)
+    new_size = (max(1, round(image.width*scale)), max(1, round(image.height*scale)))
+    image = image.resize(new_size, Image.LANCZOS)
+    canvas = Image.new('RGB', THUMBNAIL_SIZE, (255, 255, 255))
+    offset = ((THUMBNAIL_SIZE[0]-new_size[0])//2, (THUMBNAIL_SIZE[1]-new_size[1])//2)
+    canvas.paste(image, offset)
+    output = BytesIO()
+    canvas.save(output, format='PNG', optimize=True)
+    return output.getvalue()
+
+def fetch_thumbnail(url):
+    """
+    Download and normalize the thumbnail at `url` and save it in THUMBNAILS_DIR.
+    Returns the local path of the thumbnail, or None if it can't be retrieved.
+    """
+    start = time.time()
+    try:
+        resp = get_session().get(url)
+        resp.raise_for_status()
+        png_bytes = normalize_thumbnail(resp.content)
+    except Exception as e:
+        logger.warning('Could not retrieve thumbnail ' + url + ' ' + str(e))
+        emit_event('thumbnail_fetched', url=url, ok=False, duration=round(time.time() - start, 3))
+        return None
+    path = os.path.join(THUMBNAILS_DIR, hashlib.md5(png_bytes).hexdigest() + '.png')
+    if not os.path.exists(path):
+        with open(path, 'wb') as png_file:
+            png_file.write(png_bytes)
+    emit_event('thumbnail_fetched', url=url, ok=True, duration=round(time.time() - start, 3))
+    return path
+
+def localize_thumbnails(json_tree, max_workers=THUMBNAIL_WORKERS):
+    """
+    Download each unique remote thumbnail in `json_tree` and rewrite the tree to
+    use the local paths. VideoNodes with a static thumbnail don't need to derive
+    one from the video, so we set their `derive_thumbnail` to False.
+    Returns the number of unique thumbnails downloaded.
+    """
+    if not os.path.exists(THUMBNAILS_DIR):
+        os.makedirs(THUMBNAILS_DIR)
+    all_nodes = list(_iter_nodes(json_tree))
+    urls = sorted(set(node['thumbnail'] for node in all_nodes
+                      if (node.get('thumbnail') or '').startswith('http')))
+    logger.info('Retrieving ' + str(len(urls)) + ' unique thumbnails')
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        paths_by_url = dict(zip(urls, executor.map(fetch_thumbnail, urls)))
+    for node in all_nodes:
+        local_path = paths_by_url.get(node.get('thumbnail'))
+        if local_path is None:
+            continue
+        node['thumbnail'] = local_path
+        if node['kind'] == 'VideoNode':
+            node['derive_thumbnail'] = False
+    return len([path for path in paths_by_url.values() if path])
+
+def thumbnails_part(args, options):
+    """
+    Main function for PART 2c: THUMBNAILS.
+      - Reads the json tree from DATA_DIR/ricecooker_json_tree.json
+      - Downloads and normalizes each unique thumbnail into THUMBNAILS_DIR
+      - Rewrites the json tree to point to the local thumbnails
+    """
+    json_tree = read_json_tree('ricecooker_json_tree', args['tree_format'])
+    num_thumbnails = localize_thumbnails(json_tree, max_workers=args['thumbnail_workers'])
+    raise_for_invalid_json_tree(iter_tree_records(json_tree))
+    json_file_name = write_json_tree(json_tree, 'ricecooker_json_tree', args['tree_format'])
+    logger.info('Stored ' + str(num_thumbnails) + ' thumbnails in ' + THUMBNAILS_DIR)
+    logger.info('Intermediate result stored in ' + json_file_name)
+    logger.info('Thumbnails part finished.\n')
+
+
+
+# PART 2d: VIDEO PREFETCH
+################################################################################
+# The mp4 files are most of the bytes of the channel, and ricecooker only
+# downloads them in `construct_channel`, after the scrape. With --prefetch-videos
+# each video url is queued as soon as `get_video_url_for_lang` resolves it, and
+# background threads download the largest queued videos first while scraping
+# continues. The VideoFiles are then rewritten to use the copies in VIDEOS_DIR.
+
+def video_download_path(url):
+    return os.path.join(VIDEOS_DIR, hashlib.md5(url.encode('utf-8')).hexdigest() + '.mp4')
+
+def download_file(url, path):
+    """
+    Stream the file at `url` to `path` (unless a previous run downloaded it).
+    Returns `path`, or None if the download failed.
+    """
+    if os.path.exists(path):
+        return path
+    tmp_path = path + '.part'
+    try:
+        with get_download_session().get(url, stream=True, timeout=PRECHECK_TIMEOUT) as resp:
+            resp.raise_for_status()
+            with open(tmp_path, 'wb') as local_file:
+                for chunk in resp.iter_content(chunk_size=1024*1024):
+                    local_file.write(chunk)
+    except (requests.exceptions.RequestException, OSError) as e:
+        logger.warning('Could not download ' + url + ' ' + str(e))
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        return None
+    os.replace(tmp_path, path)
+    return path
+
+def download_video(url):
+    return download_file(url, video_download_path(url))
+
+class VideoDownloadScheduler(object):
+    """
+    Downloads videos in background threads, largest first. The size of a video
+    comes from the precheck manifest if we have one, otherwise from a HEAD
+    request sent by a separate thread so that `schedule` never blocks.
+    Unexpected errors in the background threads are kept in `errors` by url
+    and reported by `join`, the other videos are still downloaded.
+    """
+    def __init__(self, max_workers=VIDEO_DOWNLOAD_WORKERS):
+        if not os.path.exists(VIDEOS_DIR):
+            os.makedirs(VIDEOS_DIR)
+        self.sizes_by_url = _load_remote_sizes()
+        self.paths_by_url = {}
+        self.errors = {}
+        self._queue = queue.PriorityQueue()
+        self._counter = count()
+        self._scheduled = set()
+        self._lock = threading.Lock()
+        self._sizer = ThreadPoolExecutor(max_workers=1)
+        self._workers = [threading.Thread(target=self._download_worker, daemon=True)
+                         for _ in range(max_workers)]
+        for worker in self._workers:
+            worker.start()
+
+    def schedule(self, url):
+        """
+        Queue the video at `url` for download (once per url).
+        """
+        with self._lock:
+            if url in self._scheduled:
+                return
+            self._scheduled.add(url)
+        if self.sizes_by_url.get(url) is not None:
+            self._enqueue(url, self.sizes_by_url[url])
+        else:
+            self._sizer.submit(self._size_and_enqueue, url)
+
+    def _size_and_enqueue(self, url):
+        size = 0   # videos already in VIDEOS_DIR go last, they take no time
+        try:
+            if not os.path.exists(video_download_path(url)):
+                entry = head_remote_file(url)
+                if entry['ok']:
+                    size = entry['content_length'] or 0
+        except Exception as e:
+            logger.warning('Could not get the size of ' + url + ' ' + repr(e))
+        finally:
+            self._enqueue(url, size)   # never lose a video, even if we can't size it
+
+    def _enqueue(self, url, size):
+        # PriorityQueue returns the smallest item first
+        self._queue.put((-size, next(self._counter), url))
+
+    def _download_worker(self):
+        while True:
+            neg_size, _, url = self._queue.get()
+            if url is None:
+                return
+            start = time.time()
+            try:
+                path = download_video(url)
+            except Exception as e:
+                path = None
+                with self._lock:
+                    self.errors[url] = e
+            with self._lock:
+                self.paths_by_url[url] = path
+            emit_event('video_downloaded', url=url, size=-neg_size, ok=path is not None,
+                       duration=round(time.time() - start, 3))
+
+    def join(self):
+        """
+        Wait for all the scheduled downloads to finish and stop the threads.
+        Returns a dict `{url: local_path}` (local_path is None if the download failed).
+        The errors of the download threads are logged with their tracebacks.
+        """
+        self._sizer.shutdown(wait=True)
+        for _ in self._workers:
+            self._queue.put((float('inf'), next(self._counter), None))
+        for worker in self._workers:
+            worker.join()
+        for url, error in sorted(self.errors.items()):
+            logger.error('Video download of ' + url + ' failed', exc_info=error)
+        num_failed = len([path for path in self.paths_by_url.values() if path is None])
+        if num_failed:
+            logger.error('{} of {} video downloads failed ({} unexpected errors)'.format(
+                num_failed, len(self.paths_by_url), len(self.errors)))
+        return dict(self.paths_by_url)
+
+def localize_videos(json_tree, paths_by_url):
+    """
+    Rewrite the VideoFiles in `json_tree` to use the downloaded videos in
+    `paths_by_url`. The remote url is kept in the file's `source_url`, so the
+    channel diff still compares files by url. Returns the number of VideoFiles rewritten.
+    """
+    num_localized = 0
+    for node, f in _iter_remote_files(json_tree):
+        local_path = paths_by_url.get(f['path'])
+        if f['file_type'] == 'VideoFile' and local_path and os.path.exists(local_path):
+            f['source_url'] = f['path']
+            f['path'] = local_path
+            num_localized += 1
+    return num_localized
+
+
+
+# PART 2e: LANGUAGE VARIANTS
+################################################################################
+# The scrape merges the lessons of all languages into a single topic tree. It
+# also saves each lesson folder in LESSON_CATALOG by canonical lesson url, with
+# the source_id of the video it picked for each language. The `variantsonly`
+# part uses the catalog and the web_resource_tree to write language-filtered
+# trees `ricecooker_json_tree_<languages>` for each of --variants without
+# fetching anything. The result is the same tree that a scrape with only those
+# --languages would produce, with the json tree overrides applied.
+
+def write_lesson_catalog(lesson_catalog, languages):
+    with open(LESSON_CATALOG, 'w') as catalog_file:
+        json.dump(dict(languages=languages, lessons=lesson_catalog), catalog_file)
+    logger.info('Lesson catalog of ' + str(len(lesson_catalog)) + ' lessons stored in ' + LESSON_CATALOG)
+
+def read_lesson_catalog():
+    """
+    Returns the lesson catalog written by the scrape, or None if there isn't one.
+    """
+    if not os.path.exists(LESSON_CATALOG):
+        return None
+    with open(LESSON_CATALOG) as catalog_file:
+        return json.load(catalog_file)
+
+def project_lesson_folder(catalog_entry, languages):
+    """
+    Returns a copy of the lesson folder in `catalog_entry` that only has the
+    videos for `languages`, tagged with the first of them that uses each video.
+    """
+    from le_utils.constants.languages import getlang
+    folder = copy.deepcopy(catalog_entry['folder'])
+    videos_by_source_id = dict((n['source_id'], n) for n in folder['children'] if n['kind'] == 'VideoNode')
+    video_nodes = []
+    for lang in languages:
+        source_id = catalog_entry['videos'].get(lang)
+        if source_id is None or any(v['source_id'] == source_id for v in video_nodes):
+            continue
+        video_node = videos_by_source_id[source_id]
+        video_node['language'] = getlang(LANGUAGE_LOOKUP[lang]).code
+        for video_file in video_node['files']:
+            video_file['language'] = LANGUAGE_LOOKUP[lang]
+        video_nodes.append(video_node)
+    other_children = [n for n in folder['children'] if n['kind'] != 'VideoNode']
+    folder['children'] = video_nodes + other_children
+    return folder
+
+def project_json_tree(web_resource_tree, catalog, languages, tree_overrides=None):
+    """
+    Build the ricecooker json tree for `languages` from the lesson `catalog`.
+    Lessons that are not in the catalog are left out (they are never fetched).
+    """
+    catalog_web_tree = filter_web_resource_tree(web_resource_tree, set(catalog['lessons']), set())
+    lang_nodes = [n for n in (catalog_web_tree or {}).get('children', []) if n['lang'] in languages]
+    built_lessons = {}
+    for lesson_url, catalog_entry in catalog['lessons'].items():
+        built_lessons[lesson_url] = project_lesson_folder(catalog_entry, languages)
+    json_tree = dict(
+        kind='ChannelNode',
+        children=[],
+    )
+    _build_json_tree(json_tree, lang_nodes, languages=languages, built_lessons=built_lessons)
+    apply_json_tree_overrides(json_tree, tree_overrides or [])
+    return json_tree
+
+def variants_part(args, options):
+    """
+    Main function for PART 2e: LANGUAGE VARIANTS.
+      - Reads DATA_DIR/web_resource_tree.json and the lesson catalog LESSON_CATALOG
+      - Writes DATA_DIR/ricecooker_json_tree_<languages>.json for each of args['variants']
+    """
+    web_resource_tree = read_json_tree('web_resource_tree', args['tree_format'])
+    catalog = read_lesson_catalog()
+    if catalog is None:
+        raise FileNotFoundError('No lesson catalog found in ' + LESSON_CATALOG + ', run scrapeonly first')
+    tree_overrides = load_json_tree_overrides()
+    for variant in args['variants'] or []:
+        languages = variant.split(',')
+        unknown_languages = [lang for lang in languages if lang not in ALL_LANGUAGES]
+        if unknown_languages:
+            raise ValueError('Unknown languages in --variants: ' + ', '.join(unknown_languages))
+        missing_languages = [lang for lang in languages if lang not in catalog['languages']]
+        if missing_languages:
+            logger.warning('The catalog has no videos for ' + ', '.join(missing_languages))
+        json_tree = project_json_tree(web_resource_tree, catalog, languages, tree_overrides=tree_overrides)
+        name = 'ricecooker_json_tree_' + '_'.join(lang.lower() for lang in languages)
+        raise_for_invalid_json_tree(iter_tree_records(json_tree), name=name)
+        json_file_name = write_json_tree(json_tree, name, args['tree_format'])
+        logger.info('Variant for ' + ', '.join(languages) + ' stored in ' + json_file_name)
+    logger.info('Variants part finished.\n')
+
+
+
+# PART 2f: DOCUMENTS
+################################################################################
+# Download the transcripts and teacher guides (DocumentFiles) to DOCUMENTS_DIR,
+# then render the first page of each PDF as a thumbnail and count its pages in
+# a process pool, since rendering is CPU bound. The results are cached by the
+# sha256 of the PDF in DOCUMENTS_CACHE, so unchanged documents are not rendered
+# again. DocumentNodes without a thumbnail get the first page thumbnail, and the
+# page count and size of each document are written to DOCUMENTS_MANIFEST.
+
+def document_download_path(url):
+    ext = os.path.splitext(urlparse(url).path)[1].lower() or '.pdf'
+    return os.path.join(DOCUMENTS_DIR, hashlib.md5(url.encode('utf-8')).hexdigest() + ext)
+
+def download_document(url):
+    return download_file(url, document_download_path(url))
+
+def _sha256_file(path):
+    sha256 = hashlib.sha256()
+    with open(path, 'rb') as local_file:
+        for chunk in iter(lambda: local_file.read(1024*1024), b''):
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+def count_pdf_pages(path):
+    from PyPDF2 import PdfFileReader   # removed in PyPDF2 3, see requirements.txt
+    with open(path, 'rb') as pdf_file:
+        return len(PdfFileReader(pdf_file, strict=False).pages)
+
+def render_document(path, content_hash):
+    """
+    Runs in a worker process: count the pages of the PDF at `path` and save its
+    first page as a THUMBNAIL_SIZE png in THUMBNAILS_DIR.
+    Returns a dict `{pages, size, thumbnail}`, or `{error}` if it fails.
+    """
+    from io import BytesIO
+    from pdf2image import convert_from_path
+    try:
+        num_pages = count_pdf_pages(path)
+        first_page = convert_from_path(path, first_page=1, last_page=1)[0]
+        page_png = BytesIO()
+        first_page.save(page_png, format='PNG')
+        png_bytes = normalize_thumbnail(page_png.getvalue())
+    except Exception as e:
+        return dict(error=str(e))
+    thumbnail_path = os.path.join(THUMBNAILS_DIR, content_hash + '.png')
+    with open(thumbnail_path, 'wb') as png_file:
+        png_file.write(png_bytes)
+    return dict(pages=num_pages, size=os.path.getsize(path), thumbnail=thumbnail_path)
+
+def _load_documents_cache():
+    if not os.path.exists(DOCUMENTS_CACHE):
+        return {}
+    with open(DOCUMENTS_CACHE) as cache_file:
+        return json.load(cache_file)
+
+def process_documents(json_tree, max_workers=DOCUMENT_WORKERS):
+    """
+    Download and render the PDF DocumentFiles in `json_tree` (see PART 2f above),
+    and rewrite the tree to use the local documents and first page thumbnails.
+    Returns the manifest: a list of dicts, one for each (node, file) pair.
+    """
+    for dir_path in [DOCUMENTS_DIR, THUMBNAILS_DIR]:
+        if not os.path.exists(dir_path):
+            os.makedirs(dir_path)
+    nodes_and_files = [(node, f) for node, f in _iter_remote_files(json_tree)
+                       if f['file_type'] == 'DocumentFile']
+    urls = sorted(set(f['path'] for _, f in nodes_and_files))
+    logger.info('Downloading ' + str(len(urls)) + ' documents')
+    with ThreadPoolExecutor(max_workers=PRECHECK_WORKERS) as executor:
+        paths_by_url = dict(zip(urls, executor.map(download_document, urls)))
+
+    documents_cache = _load_documents_cache()
+    hashes_by_path = {}
+    for path in set(paths_by_url.values()):
+        if path is not None and path.endswith('.pdf'):
+            hashes_by_path[path] = _sha256_file(path)
+    to_render = {}
+    for path, content_hash in hashes_by_path.items():
+        cached = documents_cache.get(content_hash)
+        if cached is None or not os.path.exists(cached['thumbnail']):
+            to_render[content_hash] = path
+    logger.info('Rendering {} documents ({} unchanged)'.format(
+        len(to_render), len(hashes_by_path) - len(to_render)))
+    if to_render:
+        # no pool at all when every document is unchanged
+        with ProcessPoolExecutor(max_workers=min(max_workers, len(to_render))) as pool:
+            futures = dict((content_hash, pool.submit(render_document, path, content_hash))
+                           for content_hash, path in to_render.items())
+            for content_hash, future in futures.items():
+                result = future.result()
+                if 'error' in result:
+                    logger.warning('Could not render ' + to_render[content_hash] + ' ' + result['error'])
+                    continue
+                documents_cache[content_hash] = result
+        with open(DOCUMENTS_CACHE, 'w') as cache_file:
+            json.dump(documents_cache, cache_file, indent=2, sort_keys=True)
+
+    manifest = []
+    for node, f in nodes_and_files:
+        url, path = f['path'], paths_by_url[f['path']]
+        entry = dict(source_id=node['source_id'], url=url, path=path, sha256=hashes_by_path.get(path),
+                     pages=None, size=None, thumbnail=None)
+        entry.update(documents_cache.get(entry['sha256'], {}))
+        manifest.append(entry)
+        if path is None:
+            continue
+        f['source_url'] = f['path']
+        f['path'] = path
+        if not node.get('thumbnail') and entry['thumbnail']:
+            node['thumbnail'] = entry['thumbnail']
+    return manifest
+
+def documents_part(args, options):
+    """
+    Main function for PART 2f: DOCUMENTS.
+      - Reads the json tree from DATA_DIR/ricecooker_json_tree.json
+      - Downloads the documents and renders their first page thumbnails
+      - Rewrites the json tree to point to the local documents and thumbnails
+    """
+    json_tree = read_json_tree('ricecooker_json_tree', args['tree_format'])
+    manifest = process_documents(json_tree, max_workers=args['document_workers'])
+    with open(DOCUMENTS_MANIFEST, 'w') as manifest_file:
+        json.dump(manifest, manifest_file, indent=2)
+    total_pages = sum(entry['pages'] or 0 for entry in manifest)
+    total_bytes = sum(entry['size'] or 0 for entry in manifest)
+    logger.info('{} documents, {} pages, {:.1f} MB'.format(len(manifest), total_pages, total_bytes/1024/1024))
+    raise_for_invalid_json_tree(iter_tree_records(json_tree))
+    json_file_name = write_json_tree(json_tree, 'ricecooker_json_tree', args['tree_format'])
+    logger.info('Manifest stored in ' + DOCUMENTS_MANIFEST)
+    logger.info('Intermediate result stored in ' + json_file_name)
+    logger.info('Documents part finished.\n')
+
+
+
+# CHANNEL DIFF
+################################################################################
+# Compare two ricecooker_json_tree snapshots by `source_id` to see what changed
+# since the last published channel. Lesson folders can appear under several
+# topic clusters, so each source_id is mapped to the set of its parents.
+
+def _comparable_files(files):
+    """
+    Returns `files` with the local path of each downloaded file replaced by the
+    url it was downloaded from (see `localize_videos` and `process_documents`),
+    so that downloading a file doesn't count as a change.
+    """
+    comparable_files = []
+    for f in files:
+        f = dict(f)
+        if 'source_url' in f:
+            f['path'] = f.pop('source_url')
+        comparable_files.append(f)
+    return comparable_files
+
+def _index_json_tree(json_tree):
+    """
+    Returns a dict {source_id: (node_attrs, parent_source_ids)} where `node_attrs`
+    is the node dict without its children, with its files made comparable
+    (see `_comparable_files`).
+    """
+    index = {}
+    def _index(node, parent_source_id):
+        for child in node.get('children', []):
+            attrs = dict((k, v) for k, v in child.items() if k != 'children')
+            if 'files' in attrs:
+                attrs['files'] = _comparable_files(attrs['files'] or [])
+            if child['source_id'] in index:
+                index[child['source_id']][1].add(parent_source_id)
+            else:
+                index[child['source_id']] = (attrs, set([parent_source_id]))
+            _index(child, child['source_id'])
+    _index(json_tree, None)
+    return index
+
+def _load_remote_sizes():
+    sizes_by_url = {}
+    if os.path.exists(REMOTE_FILES_MANIFEST):
+        with open(REMOTE_FILES_MANIFEST) as manifest_file:
+            for entry in json.load(manifest_file):
+                sizes_by_url[entry['url']] = entry.get('content_length')
+    return sizes_by_url
+
+def _estimate_node_bytes(attrs, sizes_by_url):
+    """
+    Returns `(num_bytes, num_unknown)` for the files and thumbnail of a node.
+    Remote file sizes come from the precheck manifest (see REMOTE_FILES_MANIFEST).
+    """
+    paths = [f['path'] for f in attrs.get('files') or []]
+    if attrs.get('thumbnail'):
+        paths.append(attrs['thumbnail'])
+    num_bytes, num_unknown = 0, 0
+    for path in paths:
+        if path.startswith('http'):
+            size = sizes_by_url.get(path)
+        else:
+            size = os.path.getsize(path) if os.path.exists(path) else None
+        if size is None:
+            num_unknown += 1
+        else:
+            num_bytes += size
+    return num_bytes, num_unknown
+
+def diff_json_trees(old_tree, new_tree):
+    """
+    Compare two ricecooker json trees by `source_id`.
+    Returns a dict with the lists of `added`, `removed`, `moved`, and `modified`
+    source_ids and the estimated bytes to upload for the new and changed files.
+    """
+    old_index = _index_json_tree(old_tree)
+    new_index = _index_json_tree(new_tree)
+    sizes_by_url = _load_remote_sizes()
+
+    report = dict(added=[], removed=[], moved=[], modified=[], files_changed=[])
+    upload_bytes, unknown_sizes = 0, 0
+    for source_id, (attrs, parents) in new_index.items():
+        if source_id not in old_index:
+            report['added'].append(source_id)
+            changed_files = True
+        else:
+            old_attrs, old_parents = old_index[source_id]
+            if parents != old_parents:
+                report['moved'].append(source_id)
+            if attrs != old_attrs:
+                report['modified'].append(source_id)
+            changed_files = attrs.get('files') != old_attrs.get('files') or \
+                            attrs.get('thumbnail') != old_attrs.get('thumbnail')
+            if changed_files:
+                report['files_changed'].append(source_id)
+        if changed_files:
+            num_bytes, num_unknown = _estimate_node_bytes(attrs, sizes_by_url)
+            upload_bytes += num_bytes
+            unknown_sizes += num_unknown
+    report['removed'] = [source_id for source_id in old_index if source_id not in new_index]
+    report['upload_bytes'] = upload_bytes
+    report['unknown_sizes'] = unknown_sizes
+    return report
+
+def changed_subtree(json_tree, report):
+    """
+    Returns a copy of `json_tree` that keeps only the added, moved, and modified
+    nodes (added nodes with all their descendants) and their ancestors.
+    """
+    changed_ids = set(report['moved'] + report['modified'])
+    added_ids = set(report['added'])
+    def _prune(node):
+        if node.get('source_id') in added_ids:
+            return node
+        kept_children = []
+        for child in node.get('children', []):
+            kept_child = _prune(child)
+            if kept_child is not None:
+                kept_children.append(kept_child)
+        if not kept_children and node.get('source_id') not in changed_ids:
+            return None
+        pruned_node = dict(node)
+        if 'children' in node:
+            pruned_node['children'] = kept_children
+        return pruned_node
+    return _prune(json_tree) or dict(json_tree, children=[])
+
+def dry_run_construct(json_tree_name, tree_format='json'):
+    """
+    Build and validate the ricecooker channel for the tree `json_tree_name`
+    stored in the format `tree_format` without downloading or uploading anything.
+    """
+    from ricecooker.classes import nodes
+    from ricecooker.exceptions import raise_for_invalid_channel
+    channel = nodes.ChannelNode(
+        source_domain=CHANNEL_SOURCE_DOMAIN,
+        source_id=CHANNEL_SOURCE_ID,
+        title=CHANNEL_TITLE,
+        language=CHANNEL_LANGUAGE,
+        thumbnail=CHANNEL_THUMBNAIL,
+    )
+    timings = _build_tree_from_records(channel, iter_json_tree_records(json_tree_name, tree_format))
+    start = time.time()
+    raise_for_invalid_channel(channel)
+    log_construct_timings(timings, time.time() - start)
+    return channel
+
+def diff_part(args, options):
+    """
+    Main function for CHANNEL DIFF.
+      - Compares the tree at args['diff_base'] with DATA_DIR/ricecooker_json_tree.json
+      - Writes the report to CHANNEL_DIFF_REPORT
+      - Writes the changed subtree to DATA_DIR/ricecooker_json_tree_changes.json
+    If args['diff_dry_run'] is True, the changed subtree is built and validated
+    as a ricecooker channel.
+    """
+    if not args['diff_base']:
+        raise ValueError('--diff-base is required for the diffonly part')
+    old_tree = read_json_tree_file(args['diff_base'])
+    new_tree = read_json_tree('ricecooker_json_tree', args['tree_format'])
+    report = diff_json_trees(old_tree, new_tree)
+    with open(CHANNEL_DIFF_REPORT, 'w') as report_file:
+        json.dump(report, report_file, indent=2)
+
+    for key in ['added', 'removed', 'moved', 'modified', 'files_changed']:
+        logger.info('{:>5} nodes {}'.format(len(report[key]), key.replace('_', ' ')))
+    logger.info('Estimated upload size: {:.1f} MB ({} files of unknown size)'.format(
+        report['upload_bytes']/1024/1024, report['unknown_sizes']))
+
+    changes_tree = changed_subtree(new_tree, report)
+    changes_file_name = write_json_tree(changes_tree, 'ricecooker_json_tree_changes', args['tree_format'])
+    logger.info('Changed subtree stored in ' + changes_file_name)
+    if args['diff_dry_run']:
+        dry_run_construct('ricecooker_json_tree_changes', args['tree_format'])
+    logger.info('Diff report stored in ' + CHANNEL_DIFF_REPORT)
+    logger.info('Diff part finished.\n')
+
+
+
+# JSON TREE VALIDATION
+################################################################################
+# Check the structure of a ricecooker json tree in a single pass over its node
+# records, so that a bad tree fails right after the scrape, before it is written,
+# instead of in the middle of `construct_channel`. Source ids only need to be unique among
+# siblings, since the same lesson folder is copied under several clusters.
+
+REQUIRED_FIELDS_BY_KIND = {
+    'ChannelNode': [],
+    'TopicNode': ['source_id', 'title'],
+    'VideoNode': ['source_id', 'title', 'files'],
+    'DocumentNode': ['source_id', 'title', 'files'],
+    'HTML5AppNode': ['source_id', 'title', 'files'],
+}
+FILE_TYPES_BY_KIND = {   # kind --> (primary file type, other allowed file types)
+    'VideoNode': ('VideoFile', ['ThumbnailFile']),
+    'DocumentNode': ('DocumentFile', ['ThumbnailFile']),
+    'HTML5AppNode': ('HTMLZipFile', ['ThumbnailFile']),
+}
+
+def validate_json_tree_records(records):
+    """
+    Check the node `records` of a json tree (see `iter_tree_records`) and return
+    a list of `(source_id, problem)` tuples for all the problems found.
+    """
+    language_codes = set(LANGUAGE_LOOKUP.values())
+    kinds_by_id = {}
+    sibling_source_ids = set()   # (parent _id, source_id)
+    problems = []
+    for record in records:
+        source_id = record.get('source_id')
+        kind = record.get('kind')
+        kinds_by_id[record['_id']] = kind
+
+        if kind not in REQUIRED_FIELDS_BY_KIND:
+            problems.append((source_id, 'unexpected kind {}'.format(kind)))
+            continue
+        for field in REQUIRED_FIELDS_BY_KIND[kind]:
+            if not record.get(field):
+                problems.append((source_id, '{} is missing {}'.format(kind, field)))
+
+        parent_kind = kinds_by_id.get(record['_parent'])
+        if record['_parent'] is None and kind != 'ChannelNode':
+            problems.append((source_id, 'root node is a {}'.format(kind)))
+        elif record['_parent'] is not None and parent_kind not in ['ChannelNode', 'TopicNode']:
+            problems.append((source_id, '{} is a child of a {}'.format(kind, parent_kind)))
+        if source_id is not None:
+            if (record['_parent'], source_id) in sibling_source_ids:
+                problems.append((source_id, 'duplicate source_id among siblings'))
+            sibling_source_ids.add((record['_parent'], source_id))
+
+        if record.get('language') is not None and record['language'] not in language_codes:
+            problems.append((source_id, 'unknown language {}'.format(record['language'])))
+        thumbnail = record.get('thumbnail')
+        if thumbnail and not thumbnail.startswith('http') and not os.path.exists(thumbnail):
+            problems.append((source_id, 'missing thumbnail file {}'.format(thumbnail)))
+
+        files = record.get('files') or []
+        if kind not in FILE_TYPES_BY_KIND:
+            if files:
+                problems.append((source_id, '{} has files'.format(kind)))
+            continue
+        primary_file_type, other_file_types = FILE_TYPES_BY_KIND[kind]
+        if files and not any(f.get('file_type') == primary_file_type for f in files):
+            problems.append((source_id, '{} has no {}'.format(kind, primary_file_type)))
+        for f in files:
+            file_type = f.get('file_type')
+            if file_type != primary_file_type and file_type not in other_file_types:
+                problems.append((source_id, '{} cannot have a {}'.format(kind, file_type)))
+            path = f.get('path')
+            if not path:
+                problems.append((source_id, '{} has no path'.format(file_type)))
+            elif not path.startswith('http') and not os.path.exists(path):
+                problems.append((source_id, 'missing local file {}'.format(path)))
+            if f.get('language') is not None and f['language'] not in language_codes:
+                problems.append((source_id, 'unknown {} language {}'.format(file_type, f['language'])))
+    return problems
+
+def raise_for_invalid_json_tree(records, name='ricecooker_json_tree'):
+    """
+    Log every problem in the json tree node `records` and raise a ValueError if
+    there are any.
+    """
+    start = time.time()
+    problems = validate_json_tree_records(records)
+    for source_id, problem in problems:
+        logger.error('Invalid node {}: {}'.format(source_id, problem))
+    if problems:
+        raise ValueError('{} has {} problems'.format(name, len(problems)))
+    logger.info('Validated {} in {:.3f}s'.format(name, time.time() - start))
+
+def validate_part(args, options):
+    """
+    Validate the json tree args['validate_tree'] (default: ricecooker_json_tree).
+    """
+    if args['validate_tree']:
+        records = iter_json_tree_file_records(args['validate_tree'])
+        raise_for_invalid_json_tree(records, name=args['validate_tree'])
+    else:
+        raise_for_invalid_json_tree(iter_json_tree_records('ricecooker_json_tree', args['tree_format']))
+
+
+
+# HELPER FUNCTION FOR TESTING
+################################################################################
+
+def sample_web_resource_tree(web_resource_tree, sample_size=SAMPLE_SIZE, seed=SAMPLE_SEED):
+    """
+    Returns a copy of `web_resource_tree` that keeps `sample_size` lessons chosen
+    at random (with a fixed `seed`) from each topic cluster, and from the lessons
+    of each topic that are not in a cluster. Since the languages are merged into
+    a single topic tree, each group is sampled once by lesson url for all languages.
+    """
+    urls_by_group = {}
+    for lang_node in web_resource_tree['children']:
+        for topic_node in lang_node['children']:
+            for child in topic_node['children']:
+                if child['__class__'] == 'MitBlossomsTopicCluster':
+                    group, lesson_nodes = (topic_node['title'], child['title']), child['children']
+                else:
+                    group, lesson_nodes = (topic_node['title'], None), [child]
+                group_urls = urls_by_group.setdefault(group, set())
+                group_urls.update(canonical_lesson_url(n['url']) for n in lesson_nodes if 'url' in n)
+
+    sampled_urls_by_group = {}
+    for group, group_urls in urls_by_group.items():
+        rng = random.Random('{}:{}:{}'.format(seed, *group))
+        group_urls = sorted(group_urls)
+        sampled_urls_by_group[group] = set(rng.sample(group_urls, min(sample_size, len(group_urls))))
+
+    def _is_sampled(lesson_node, group):
+        return canonical_lesson_url(lesson_node['url']) in sampled_urls_by_group[group]
+
+    sampled_tree = dict(web_resource_tree, children=[])
+    for lang_node in web_resource_tree['children']:
+        sampled_lang = dict(lang_node, children=[])
+        for topic_node in lang_node['children']:
+            sampled_topic = dict(topic_node, children=[])
+            for child in topic_node['children']:
+                if child['__class__'] == 'MitBlossomsTopicCluster':
+                    group = (topic_node['title'], child['title'])
+                    kept_lessons = [n for n in child['children'] if 'url' in n and _is_sampled(n, group)]
+                    if kept_lessons:
+                        sampled_topic['children'].append(dict(child, children=kept_lessons))
+                elif 'url' in child and _is_sampled(child, (topic_node['title'], None)):
+                    sampled_topic['children'].append(child)
+            if sampled_topic['children']:
+                sampled_lang['children'].append(sampled_topic)
+        sampled_tree['children'].append(sampled_lang)
+    num_sampled = sum(len(urls) for urls in sampled_urls_by_group.values())
+    logger.info('Sampled {} lessons from {} topics and clusters'.format(num_sampled, len(urls_by_group)))
+    return sampled_tree
 
 
 
 # PART 3
 ################################################################################
 
-def _build_tree(parent_node, sourcetree):
+_MIT_BLOSSOMS_LICENSE = None
+
+def get_mit_blossoms_license():
     """
-    Parse nodes given in `sourcetree` and add as children of `parent_node`.
+    Returns the ricecooker license object for all content nodes (created on first use).
+    """
+    global _MIT_BLOSSOMS_LICENSE
+    if _MIT_BLOSSOMS_LICENSE is None:
+        from ricecooker.classes.licenses import get_license
+        _MIT_BLOSSOMS_LICENSE = get_license(MIT_BLOSSOMS_LICENSE_ID,
+                                            copyright_holder=MIT_BLOSSOMS_COPYRIGHT_HOLDER)
+    return _MIT_BLOSSOMS_LICENSE
+
+def _build_node(source_node):
+    """
+    Create the ricecooker node (with files but without children) for `source_node`.
     """
+    from ricecooker.classes import nodes
+    license = get_mit_blossoms_license()
     EXPECTED_NODE_TYPES = ['TopicNode', 'VideoNode', 'DocumentNode', 'HTML5AppNode']
 
+    kind = source_node['kind']
+    if kind not in EXPECTED_NODE_TYPES:
+        logger.critical('Unexpected Node type found: ' + kind)
+        raise NotImplementedError('Unexpected Node type found in channel json.')
+
+    if kind == 'TopicNode':
+        child_node = nodes.TopicNode(
+            source_id=source_node["source_id"],
+            title=source_node["title"],
+            author=source_node.get("author"),
+            description=source_node.get("description"),
+            language=source_node.get("language"),
+            thumbnail=source_node.get("thumbnail"),
+        )
+
+    elif kind == 'VideoNode':
+        child_node = nodes.VideoNode(
+            source_id=source_node["source_id"],
+            title=source_node["title"],
+            license=license,
+            author=source_node.get("author"),
+            description=source_node.get("description"),
+            language=source_node.get("language"),
+            derive_thumbnail=source_node.get('derive_thumbnail', True),   # video-specific data
+            thumbnail=source_node.get('thumbnail'),
+        )
+        add_files(child_node, source_node.get("files") or [])
+
+    elif kind == 'DocumentNode':
+        child_node = nodes.DocumentNode(
+            source_id=source_node["source_id"],
+            title=source_node["title"],
+            license=license,
+            author=source_node.get("author"),
+            description=source_node.get("description"),
+            language=source_node.get("language"),
+            thumbnail=source_node.get("thumbnail"),
+        )
+        add_files(child_node, source_node.get("files") or [])
+
+    elif kind == 'HTML5AppNode':
+        child_node = nodes.HTML5AppNode(
+            source_id=source_node["source_id"],
+            title=source_node["title"],
+            license=license,
+            author=source_node.get("author"),
+            description=source_node.get("description"),
+            language=source_node.get("language"),
+            thumbnail=source_node.get("thumbnail"),
+        )
+        add_files(child_node, source_node.get("files") or [])
+
+    return child_node
+
+
+def _build_tree(parent_node, sourcetree):
+    """
+    Parse nodes given in `sourcetree` and add as children of `parent_node`.
+    """
     for source_node in sourcetree:
-        kind = source_node['kind']
-        if kind not in EXPECTED_NODE_TYPES:
-            logger.critical('Unexpected Node type found: ' + kind)
-            raise NotImplementedError('Unexpected Node type found in channel json.')
-
-        if kind == 'TopicNode':
-            child_node = nodes.TopicNode(
-                source_id=source_node["source_id"],
-                title=source_node["title"],
-                author=source_node.get("author"),
-                description=source_node.get("description"),
-                language=source_node.get("language"),
-                thumbnail=source_node.get("thumbnail"),
-            )
-            parent_node.add_child(child_node)
+        child_node = _build_node(source_node)
+        parent_node.add_child(child_node)
+        if source_node['kind'] == 'TopicNode':
             source_tree_children = source_node.get("children", [])
             _build_tree(child_node, source_tree_children)
 
-        elif kind == 'VideoNode':
-            child_node = nodes.VideoNode(
-                source_id=source_node["source_id"],
-                title=source_node["title"],
-                license=MIT_BLOSSOMS_LICENSE,
-                author=source_node.get("author"),
-                description=source_node.get("description"),
-                language=source_node.get("language"),
-                derive_thumbnail=True,                     # video-specific data
-                thumbnail=source_node.get('thumbnail'),
-            )
-            add_files(child_node, source_node.get("files") or [])
-            parent_node.add_child(child_node)
-
-        elif kind == 'DocumentNode':
-            child_node = nodes.DocumentNode(
-                source_id=source_node["source_id"],
-                title=source_node["title"],
-                license=MIT_BLOSSOMS_LICENSE,
-                author=source_node.get("author"),
-                description=source_node.get("description"),
-                language=source_node.get("language"),
-                thumbnail=source_node.get("thumbnail"),
-            )
-            add_files(child_node, source_node.get("files") or [])
-            parent_node.add_child(child_node)
-
-        elif kind == 'HTML5AppNode':
-            child_node = nodes.HTML5AppNode(
-                source_id=source_node["source_id"],
-                title=source_node["title"],
-                license=MIT_BLOSSOMS_LICENSE,
-                author=source_node.get("author"),
-                description=source_node.get("description"),
-                language=source_node.get("language"),
-                thumbnail=source_node.get("thumbnail"),
-            )
-            add_files(child_node, source_node.get("files") or [])
-            parent_node.add_child(child_node)
+    return parent_node
 
-        else:
-            logger.critical("Encountered an unknown content node format.")
-            continue
 
-    return parent_node
+def _build_tree_from_records(channel, records):
+    """
+    Build the channel from the flat node records (see JSON TREE FILES) one node
+    at a time. The records are never held as a nested json tree, but the channel
+    keeps every node it builds, so memory still grows with the size of the channel.
+    Returns a dict of timings by kind: {kind: [count, build_seconds]}.
+    """
+    timings = {}
+    parents = {}
+    for record in records:
+        if record['_parent'] is None:
+            parents[record['_id']] = channel
+            continue
+        start = time.time()
+        child_node = _build_node(record)
+        parents[record['_parent']].add_child(child_node)
+        if record['kind'] == 'TopicNode':
+            parents[record['_id']] = child_node
+        duration = time.time() - start
+        emit_event('node_built', kind=record['kind'], source_id=record['source_id'],
+                   duration=round(duration, 3))
+        timing = timings.setdefault(record['kind'], [0, 0.0])
+        timing[0] += 1
+        timing[1] += duration
+    return timings
+
+def log_construct_timings(timings, validation_seconds):
+    logger.info('Channel construction timings by kind:')
+    for kind, (count, build_seconds) in sorted(timings.items()):
+        logger.info('  {:<14} {:>6} nodes  build {:7.3f}s'.format(kind, count, build_seconds))
+    logger.info('  validation took {:.3f}s'.format(validation_seconds))
 
 
 def add_files(node, file_list):
+    from ricecooker.classes import files
+    from ricecooker.exceptions import UnknownFileTypeError
     EXPECTED_FILE_TYPES = ['VideoFile', 'ThumbnailFile', 'HTMLZipFile', 'DocumentFile']
 
     for f in file_list:
@@ -1065,62 +2877,145 @@ def add_files(node, file_list):
 
 
 
-
-
-
 # CHEF
 ################################################################################
+CHEF_PARTS = ['crawlonly', 'scrapeonly', 'thumbnailsonly', 'documentsonly', 'precheckonly', 'diffonly',
+              'variantsonly', 'validateonly', 'eventsummary', 'benchmarkpool', 'webcache', 'main']
 
-class MitBlossomsSushiChef(SushiChef):
+def add_chef_arguments(parser):
+    """
+    Add the MIT Blossoms specific command line arguments to `parser`.
     """
-    This class contains all the methods for the MIT Blossoms sushi chef.
+    parser.add_argument('--languages', nargs='*', default=SELECTED_LANGUAGES,
+                        choices=ALL_LANGUAGES,
+                        help='List of languages to import')
+    parser.add_argument('--parts', nargs='*', default=['main'],
+                        choices=CHEF_PARTS,
+                        help='Which parts of import pipeline to run')
+    parser.add_argument('--full-crawl', action='store_true',
+                        help='Fetch the topic clusters of all lessons instead of reusing the last crawl.')
+    parser.add_argument('--pruned', action='store_true',
+                        help='Only scrape a sample of the lessons for testing purposes.')
+    parser.add_argument('--sample-size', type=int, default=SAMPLE_SIZE,
+                        help='Number of lessons per topic and topic cluster kept with --pruned.')
+    parser.add_argument('--sample-seed', type=int, default=SAMPLE_SEED,
+                        help='Random seed used to sample the lessons with --pruned.')
+    parser.add_argument('--only-lesson', nargs='*', metavar='LESSON',
+                        help='Re-scrape only these lessons (node ids like node-7647 or urls).')
+    parser.add_argument('--only-topic', nargs='*', metavar='TITLE',
+                        help='Re-scrape only these topics or topic clusters (by title).')
+    parser.add_argument('--tree-format', default='json', choices=TREE_FORMATS,
+                        help='File format of web_resource_tree and ricecooker_json_tree, '
+                             'used for both reading and writing the trees.')
+    parser.add_argument('--variants', nargs='*', metavar='LANGS',
+                        help='Languages of each tree made by the variantsonly part, '
+                             'comma-separated (e.g. Arabic English,Hindi).')
+    parser.add_argument('--validate-tree', metavar='PATH',
+                        help='Json tree file to check with the validateonly part (default: ricecooker_json_tree).')
+    parser.add_argument('--diff-base', metavar='PATH',
+                        help='Previous ricecooker_json_tree to compare against in the diffonly part.')
+    parser.add_argument('--diff-dry-run', action='store_true',
+                        help='Build and validate a channel from the changed subtree only.')
+    parser.add_argument('--events', metavar='PATH',
+                        help='Write progress events as json lines to PATH (file, pipe, or - for stdout). '
+                             'With --parts eventsummary, the events file to summarize.')
+    parser.add_argument('--pool-maxsize', type=int, default=POOL_MAXSIZE,
+                        help='Maximum number of connections kept open per host.')
+    parser.add_argument('--pool-block', action='store_true',
+                        help='Wait for a free pooled connection instead of opening (and discarding) extra ones.')
+    parser.add_argument('--no-tcp-keepalive', action='store_true',
+                        help='Disable TCP keep-alive probes on pooled connections.')
+    parser.add_argument('--benchmark-requests', type=int, default=1000,
+                        help='Number of requests sent by the benchmarkpool part.')
+    parser.add_argument('--benchmark-certfile', metavar='PEM',
+                        help='Certificate and key for a TLS server in the benchmarkpool part.')
+    parser.add_argument('--cache-host', nargs='*', metavar='HOST',
+                        help='With --parts webcache, only select the entries for these hosts.')
+    parser.add_argument('--cache-match', metavar='REGEX',
+                        help='With --parts webcache, only select the entries whose url matches REGEX.')
+    parser.add_argument('--cache-older-than', type=float, metavar='DAYS',
+                        help='With --parts webcache, only select the entries cached more than DAYS ago.')
+    parser.add_argument('--cache-prune', action='store_true',
+                        help='With --parts webcache, delete the selected entries (needs a filter: '
+                             '--cache-host, --cache-match, or --cache-older-than).')
+    parser.add_argument('--cache-prune-all', action='store_true',
+                        help='With --parts webcache, delete all the selected entries, even without a filter.')
+    parser.add_argument('--cache-pack', metavar='PATH',
+                        help='With --parts webcache, pack the selected entries into the zip file PATH.')
+    parser.add_argument('--cache-unpack', metavar='PATH',
+                        help='With --parts webcache, add the entries from the pack PATH to the cache.')
+    parser.add_argument('--max-rss-mb', type=int,
+                        help='Stop the scrape if the peak RSS of the process goes over this many MB.')
+    parser.add_argument('--profile', action='store_true',
+                        help='Profile each part with cProfile and tracemalloc (see chefdata/profiles/).')
+    parser.add_argument('--profile-top', type=int, default=PROFILE_TOP_N,
+                        help='Number of functions and allocation sites to report when profiling.')
+    parser.add_argument('--thumbnail-workers', type=int, default=THUMBNAIL_WORKERS,
+                        help='Number of concurrent thumbnail downloads.')
+    parser.add_argument('--prefetch-videos', action='store_true',
+                        help='Download the videos in the background during the scrape.')
+    parser.add_argument('--video-workers', type=int, default=VIDEO_DOWNLOAD_WORKERS,
+                        help='Number of concurrent video downloads with --prefetch-videos.')
+    parser.add_argument('--document-workers', type=int, default=DOCUMENT_WORKERS,
+                        help='Number of processes rendering document thumbnails.')
+    parser.add_argument('--precheck-workers', type=int, default=PRECHECK_WORKERS,
+                        help='Number of concurrent HEAD requests during precheck.')
+    parser.add_argument('--drop-missing', action='store_true',
+                        help='Remove nodes with dead links from the json tree.')
+
+
+class MitBlossomsChefParts(object):
+    """
+    The parts of the MIT Blossoms chef that run before the channel is constructed.
+    These don't depend on ricecooker's chef machinery, so partial runs like
+    `--parts crawlonly` can use this class directly and start fast.
     """
-    channel_info = {
-        'CHANNEL_TITLE': CHANNEL_TITLE,
-        'CHANNEL_SOURCE_DOMAIN': CHANNEL_SOURCE_DOMAIN,
-        'CHANNEL_SOURCE_ID': CHANNEL_SOURCE_ID,
-        'CHANNEL_LANGUAGE': CHANNEL_LANGUAGE,
-        'CHANNEL_THUMBNAIL': CHANNEL_THUMBNAIL,
-        'CHANNEL_DESCRIPTION': None, # TODO(ivan)  add chennel description
-    }
 
-    def __init__(self, *args, **kwargs):
+    def crawl(self, args, options):
         """
-        The MIT Blossoms Sushi Chef acceps the `--parts` command line arguement
-        which controls which parts of the import pipeline should run.
-          - `--parts crawlonly` build `chefdata/web_resource_tree.json` then exit
-          - `--parts scrapeonly` build `chefdata/ricecooker_json_tree.json` then exit
-          - `--parts main` run the entire pipeline (default)
+        Call function for PART 1: CRAWLING.
         """
-        super(MitBlossomsSushiChef, self).__init__(*args, **kwargs)
+        crawling_part(args, options)
 
-        self.arg_parser = argparse.ArgumentParser(
-            description="Sushi chef for MIT Blossoms video lessons.",
-            parents=[self.arg_parser]
-        )
-        self.arg_parser.add_argument('--languages', nargs='*', default=SELECTED_LANGUAGES,
-                                     choices=ALL_LANGUAGES,
-                                     help='List of languages to import')
-        self.arg_parser.add_argument('--parts', nargs='*', default=['main'],
-                                     choices=['crawlonly', 'scrapeonly', 'main',],
-                                     help='Which parts of import pipeline to run')
-        self.arg_parser.add_argument('--pruned', action='store_true',
-                                     help='Prune tree for testing purposes.')
+    def scrape(self, args, options):
+        """
+        Call function for PART 2: SCRAPING.
+        If `--only-lesson` or `--only-topic` are given, only those are re-scraped.
+        """
+        if args['only_lesson'] or args['only_topic']:
+            partial_scraping_part(args, options)
+        else:
+            scraping_part(args, options)
 
+    def thumbnails(self, args, options):
+        """
+        Call function for PART 2c: THUMBNAILS.
+        """
+        thumbnails_part(args, options)
 
+    def documents(self, args, options):
+        """
+        Call function for PART 2f: DOCUMENTS.
+        """
+        documents_part(args, options)
 
-    def crawl(self, args, options):
+    def precheck(self, args, options):
         """
-        Call function for PART 1: CRAWLING.
+        Call function for PART 2b: REMOTE FILES PRECHECK.
         """
-        crawling_part(args, options)
+        precheck_part(args, options)
 
-    def scrape(self, args, options):
+    def diff(self, args, options):
         """
-        Call function for PART 2: SCRAPING.
+        Call function for CHANNEL DIFF.
+        """
+        diff_part(args, options)
+
+    def variants(self, args, options):
         """
-        scraping_part(args, options)
-        apply_json_tree_overrides()
+        Call function for PART 2e: LANGUAGE VARIANTS.
+        """
+        variants_part(args, options)
 
     def pre_run(self, args, options):
         """
@@ -1130,21 +3025,371 @@ class MitBlossomsSushiChef(SushiChef):
           - scrape content and links from video lessons to build the json tree
             of the channel (see result in `chefdata/ricecooker_json_tree.json`)
           - perform manual content fixes for video lessons with non-standard markup
+          - download and normalize the lesson thumbnails (see `chefdata/thumbnails/`)
+          - download the documents and render their first page thumbnails
+            (see result in `chefdata/documents_manifest.json`)
+          - check remote video and document files are available before download
+            (see result in `chefdata/remote_files_manifest.json`)
         """
         self.crawl(args, options)
         self.scrape(args, options)
+        self.thumbnails(args, options)
+        self.documents(args, options)
+        self.precheck(args, options)
+
+
+_SUSHI_CHEF_CLASS = None
+
+def get_sushi_chef_class():
+    """
+    Returns the `MitBlossomsSushiChef` class, defined on the first call since
+    importing `ricecooker.chefs` is slow and isn't needed by the partial runs
+    (see `docs/import_time_budget.txt`).
+    """
+    global _SUSHI_CHEF_CLASS
+    if _SUSHI_CHEF_CLASS is not None:
+        return _SUSHI_CHEF_CLASS
+    from ricecooker.chefs import SushiChef
+
+    class MitBlossomsSushiChef(MitBlossomsChefParts, SushiChef):
+        """
+        This class contains all the methods for the MIT Blossoms sushi chef.
+        """
+        channel_info = {
+            'CHANNEL_TITLE': CHANNEL_TITLE,
+            'CHANNEL_SOURCE_DOMAIN': CHANNEL_SOURCE_DOMAIN,
+            'CHANNEL_SOURCE_ID': CHANNEL_SOURCE_ID,
+            'CHANNEL_LANGUAGE': CHANNEL_LANGUAGE,
+            'CHANNEL_THUMBNAIL': CHANNEL_THUMBNAIL,
+            'CHANNEL_DESCRIPTION': None, # TODO(ivan)  add chennel description
+        }
+
+        def __init__(self, *args, **kwargs):
+            """
+            The MIT Blossoms Sushi Chef acceps the `--parts` command line arguement
+            which controls which parts of the import pipeline should run.
+              - `--parts crawlonly` build `chefdata/web_resource_tree.json` then exit
+              - `--parts scrapeonly` build `chefdata/ricecooker_json_tree.json` then exit
+              - `--parts thumbnailsonly` download lesson thumbnails into `chefdata/thumbnails/` then exit
+              - `--parts precheckonly` HEAD-check remote files and write a manifest then exit
+              - `--parts diffonly` compare `--diff-base` with the current json tree then exit
+              - `--parts eventsummary` summarize the progress events in `--events` then exit
+              - `--parts benchmarkpool` measure connection reuse against a local server then exit
+              - `--parts main` run the entire pipeline (default)
+            """
+            super(MitBlossomsSushiChef, self).__init__(*args, **kwargs)
+
+            self.arg_parser = argparse.ArgumentParser(
+                description="Sushi chef for MIT Blossoms video lessons.",
+                parents=[self.arg_parser]
+            )
+            add_chef_arguments(self.arg_parser)
+
+        def construct_channel(self, **kwargs):
+            from ricecooker.exceptions import raise_for_invalid_channel
+            channel = self.get_channel(**kwargs)
+            tree_format = kwargs.get('tree_format') or 'json'
+            raise_for_invalid_json_tree(iter_json_tree_records('ricecooker_json_tree', tree_format))
+            # Stream json tree data (works for all TREE_FORMATS)
+            json_tree_records = iter_json_tree_records('ricecooker_json_tree', tree_format)
+            timings = _build_tree_from_records(channel, json_tree_records)
+            start = time.time()
+            raise_for_invalid_channel(channel)
+            validation_seconds = time.time() - start
+            log_construct_timings(timings, validation_seconds)
+            return channel
+
+    _SUSHI_CHEF_CLASS = MitBlossomsSushiChef
+    return _SUSHI_CHEF_CLASS
+
+
+
+# WEB CACHE ADMIN
+################################################################################
+# The `webcache` part lists the responses in WEBCACHE_DIR by host and url, with
+# their size and age. The entries can be filtered with --cache-host,
+# --cache-match (a regular expression for the url), and --cache-older-than
+# (days), and the selected entries can be deleted with --cache-prune or packed
+# into a single zip file with --cache-pack. --cache-prune needs at least one of
+# the filters; use --cache-prune-all to delete the whole cache. Use --cache-unpack
+# on a new worker to warm its cache from a pack before the first crawl.
+# The cache files are named by the hash of the url, and cachecontrol doesn't
+# store the url in them, so the entries cached before WEBCACHE_INDEX existed
+# can't be mapped back to their urls. They are listed under the host '?', never
+# match --cache-match, and can be selected with `--cache-host '?'` (e.g. to
+# prune them, since they are re-fetched and indexed on the next crawl).
+
+def _webcache_key_path(url, cache_dir=WEBCACHE_DIR):
+    hashed = hashlib.sha224(url.encode()).hexdigest()   # see cachecontrol's FileCache._fn
+    return os.path.join(cache_dir, *(list(hashed[:5]) + [hashed]))
+
+def list_webcache_entries(cache_dir=WEBCACHE_DIR):
+    """
+    Returns a list of dicts `{url, host, path, size, mtime}` for each cached
+    response in `cache_dir`, sorted by host and url.
+    """
+    urls_by_path = {}
+    for url in read_webcache_index(os.path.join(cache_dir, WEBCACHE_INDEX)):
+        urls_by_path[_webcache_key_path(url, cache_dir)] = url
+    entries = []
+    for dirpath, _, filenames in os.walk(cache_dir):
+        for filename in filenames:
+            if len(filename) != 56 or not re.match(r'^[0-9a-f]+$', filename):
+                continue   # skip the index and the .lock files
+            path = os.path.join(dirpath, filename)
+            stat = os.stat(path)
+            url = urls_by_path.get(path)
+            entries.append(dict(
+                url=url,
+                host=urlparse(url).netloc if url else '?',
+                path=path,
+                size=stat.st_size,
+                mtime=stat.st_mtime,
+            ))
+    entries.sort(key=lambda e: (e['host'], e['url'] or e['path']))
+    return entries
+
+def filter_webcache_entries(entries, hosts=None, pattern=None, older_than_days=None):
+    """
+    Select the `entries` from the hosts in `hosts`, whose url matches the regular
+    expression `pattern`, and that were cached more than `older_than_days` ago.
+    """
+    if hosts:
+        entries = [e for e in entries if e['host'] in hosts]
+    if pattern:
+        url_re = re.compile(pattern)
+        entries = [e for e in entries if e['url'] and url_re.search(e['url'])]
+    if older_than_days is not None:
+        cutoff = time.time() - older_than_days*24*60*60
+        entries = [e for e in entries if e['mtime'] < cutoff]
+    return entries
+
+def prune_webcache(entries, cache_dir=WEBCACHE_DIR):
+    """
+    Delete the cache files of `entries` and remove their urls from the index.
+    Returns the number of bytes freed.
+    """
+    pruned_urls = set()
+    num_bytes = 0
+    for entry in entries:
+        for path in [entry['path'], entry['path'] + '.lock']:
+            if os.path.exists(path):
+                os.remove(path)
+        num_bytes += entry['size']
+        pruned_urls.add(entry['url'])
+    index_path = os.path.join(cache_dir, WEBCACHE_INDEX)
+    kept_urls = [url for url in read_webcache_index(index_path) if url not in pruned_urls]
+    with open(index_path, 'w') as index_file:
+        for url in kept_urls:
+            index_file.write(json.dumps(dict(url=url)) + '\n')
+    return num_bytes
+
+def pack_webcache(entries, pack_path, cache_dir=WEBCACHE_DIR):
+    """
+    Write the cache files of `entries` and their urls to the zip file `pack_path`.
+    """
+    with zipfile.ZipFile(pack_path, 'w', compression=zipfile.ZIP_DEFLATED) as pack:
+        for entry in entries:
+            pack.write(entry['path'], os.path.relpath(entry['path'], cache_dir))
+        urls = [entry['url'] for entry in entries if entry['url']]
+        pack.writestr(WEBCACHE_INDEX, ''.join(json.dumps(dict(url=url)) + '\n' for url in urls))
+
+def unpack_webcache(pack_path, cache_dir=WEBCACHE_DIR):
+    """
+    Add the cache files in the zip file `pack_path` to `cache_dir`, keeping
+    their original modification times and merging their urls into the index.
+    Returns the number of cache files added.
+    """
+    index_path = os.path.join(cache_dir, WEBCACHE_INDEX)
+    known_urls = read_webcache_index(index_path)
+    packed_urls, num_files = [], 0
+    with zipfile.ZipFile(pack_path) as pack:
+        for info in pack.infolist():
+            if info.filename == WEBCACHE_INDEX:
+                packed_urls = pack.read(info).decode('utf-8').splitlines()
+                continue
+            path = pack.extract(info, cache_dir)
+            mtime = time.mktime(info.date_time + (0, 0, -1))
+            os.utime(path, (mtime, mtime))
+            num_files += 1
+    new_urls = set(json.loads(line)['url'] for line in packed_urls if line.strip()) - set(known_urls)
+    with open(index_path, 'a') as index_file:
+        for url in sorted(new_urls):
+            index_file.write(json.dumps(dict(url=url)) + '\n')
+    return num_files
+
+def webcache_part(args, options):
+    """
+    List, prune, pack, or unpack the web cache (see WEB CACHE ADMIN above).
+    """
+    has_filter = args['cache_host'] or args['cache_match'] or args['cache_older_than'] is not None
+    if args['cache_prune'] and not has_filter and not args['cache_prune_all']:
+        raise ValueError('--cache-prune needs --cache-host, --cache-match, or --cache-older-than '
+                         'to select the entries to delete (use --cache-prune-all to delete all entries)')
+    if not os.path.exists(WEBCACHE_DIR):
+        os.makedirs(WEBCACHE_DIR)
+    if args['cache_unpack']:
+        num_files = unpack_webcache(args['cache_unpack'])
+        logger.info('Added ' + str(num_files) + ' cached responses from ' + args['cache_unpack'])
+
+    entries = filter_webcache_entries(list_webcache_entries(), hosts=args['cache_host'],
+                                      pattern=args['cache_match'],
+                                      older_than_days=args['cache_older_than'])
+    now = time.time()
+    for host, host_entries in groupby(entries, key=lambda e: e['host']):
+        host_entries = list(host_entries)
+        logger.info('{}  {} entries  {:.1f} MB'.format(
+            host, len(host_entries), sum(e['size'] for e in host_entries)/1024/1024))
+        for entry in host_entries:
+            logger.info('  {:>10} B  {:>6.1f} days  {}'.format(
+                entry['size'], (now - entry['mtime'])/24/60/60, entry['url'] or entry['path']))
+    total_bytes = sum(e['size'] for e in entries)
+    logger.info('{} entries  {:.1f} MB'.format(len(entries), total_bytes/1024/1024))
+
+    if args['cache_pack']:
+        pack_webcache(entries, args['cache_pack'])
+        logger.info('Packed ' + str(len(entries)) + ' entries into ' + args['cache_pack'])
+    if args['cache_prune'] or args['cache_prune_all']:
+        num_bytes = prune_webcache(entries)
+        logger.info('Pruned {} entries ({:.1f} MB)'.format(len(entries), num_bytes/1024/1024))
+
+
+
+# CONNECTION POOL BENCHMARK
+################################################################################
+# Measures the connection (and TLS) setup time saved by reusing pooled
+# connections, against a local HTTP/1.1 server. See `docs/connection_pool_benchmark.txt`.
+
+def _make_benchmark_server(certfile=None):
+    """
+    Returns a local HTTP/1.1 server (with TLS if `certfile` is given) that
+    counts the connections it accepts in `server.num_connections`.
+    """
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class BenchmarkHandler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'   # keep connections open unless asked to close
+        disable_nagle_algorithm = True  # headers and body are sent separately
+
+        def setup(self):
+            self.server.num_connections += 1
+            BaseHTTPRequestHandler.setup(self)
+
+        def do_GET(self):
+            body = b'ok'
+            self.send_response(200)
+            self.send_header('Content-Length', str(len(body)))
+            if self.close_connection:
+                self.send_header('Connection', 'close')
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), BenchmarkHandler)
+    server.daemon_threads = True
+    server.num_connections = 0
+    if certfile:
+        import ssl
+        context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        context.load_cert_chain(certfile)
+        server.socket = context.wrap_socket(server.socket, server_side=True)
+    return server
+
+def _run_benchmark_requests(url, num_requests, workers, reuse_connections, verify):
+    session = requests.Session()
+    adapter = _configure_pools(requests.adapters.HTTPAdapter(), pool_maxsize=workers, pool_block=True,
+                               count_connections=False)
+    session.mount(url, adapter)
+    headers = {} if reuse_connections else {'Connection': 'close'}
+    def _get(i):
+        session.get(url, headers=headers, verify=verify).raise_for_status()
+    start = time.time()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        list(executor.map(_get, range(num_requests)))
+    return time.time() - start
+
+def benchmark_connection_reuse(num_requests=1000, workers=8, certfile=None):
+    """
+    Send `num_requests` to a local server with and without connection reuse.
+    If `certfile` (PEM with certificate and key) is given, the server uses TLS.
+    Returns a dict with the time and the connections opened for both runs.
+    """
+    server = _make_benchmark_server(certfile)
+    scheme = 'https' if certfile else 'http'
+    if certfile:
+        requests.packages.urllib3.disable_warnings()   # self-signed certificate
+    url = '{}://127.0.0.1:{}/'.format(scheme, server.server_address[1])
+    server_thread = threading.Thread(target=server.serve_forever, daemon=True)
+    server_thread.start()
+    results = {}
+    try:
+        for name, reuse_connections in [('no_reuse', False), ('reuse', True)]:
+            server.num_connections = 0
+            seconds = _run_benchmark_requests(url, num_requests, workers, reuse_connections, verify=False)
+            results[name] = dict(seconds=seconds, connections=server.num_connections)
+    finally:
+        server.shutdown()
+        server.server_close()
+    saved_seconds = results['no_reuse']['seconds'] - results['reuse']['seconds']
+    results['saved_ms_per_1000_requests'] = saved_seconds / num_requests * 1000 * 1000
+    results['scheme'] = scheme
+    return results
+
+def benchmark_pool_part(args, options):
+    results = benchmark_connection_reuse(
+        num_requests=args['benchmark_requests'],
+        workers=args['pool_maxsize'],
+        certfile=args['benchmark_certfile'],
+    )
+    for name in ['no_reuse', 'reuse']:
+        logger.info('{:<9} {:>8.3f}s  {:>5} connections  ({} requests over {})'.format(
+            name, results[name]['seconds'], results[name]['connections'],
+            args['benchmark_requests'], results['scheme']))
+    logger.info('Connection setup saved per 1000 requests: {:.0f} ms'.format(
+        results['saved_ms_per_1000_requests']))
+
 
 
+# PROFILING
+################################################################################
 
-    def construct_channel(self, **kwargs):
-        channel = self.get_channel(**kwargs)
-        # Load json tree data
-        json_tree = None
-        with open(os.path.join(DATA_DIR, 'ricecooker_json_tree.json')) as infile:
-            json_tree = json.load(infile)
-        _build_tree(channel, json_tree['children'])
-        raise_for_invalid_channel(channel)
-        return channel
+def profile_part(part, run_part, top_n=PROFILE_TOP_N):
+    """
+    Run `run_part()` under cProfile and tracemalloc. Saves the `.prof` file and
+    a summary of the top allocations to PROFILES_DIR, then prints the `top_n`
+    functions by cumulative time.
+    """
+    import cProfile
+    import pstats
+    import tracemalloc
+
+    if not os.path.exists(PROFILES_DIR):
+        os.makedirs(PROFILES_DIR)
+    basename = os.path.join(PROFILES_DIR, part + '-' + time.strftime('%Y%m%d-%H%M%S'))
+
+    profiler = cProfile.Profile()
+    tracemalloc.start()
+    profiler.enable()
+    try:
+        run_part()
+    finally:
+        profiler.disable()
+        snapshot = tracemalloc.take_snapshot()
+        current_size, peak_size = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        profiler.dump_stats(basename + '.prof')
+        with open(basename + '-memory.txt', 'w') as memory_file:
+            memory_file.write('Peak traced memory: {:.1f} MB\n'.format(peak_size/1024/1024))
+            memory_file.write('Traced memory at end: {:.1f} MB\n\n'.format(current_size/1024/1024))
+            memory_file.write('Top {} allocations by line:\n'.format(top_n))
+            for stat in snapshot.statistics('lineno')[:top_n]:
+                memory_file.write(str(stat) + '\n')
+        logger.info('Profile for part ' + part + ' stored in ' + basename + '.prof')
+        logger.info('Memory summary for part ' + part + ' stored in ' + basename + '-memory.txt')
+        pstats.Stats(profiler).sort_stats('cumulative').print_stats(top_n)
 
 
 
@@ -1156,20 +3401,61 @@ if __name__ == '__main__':
     The command line argument parsing is handled by the chef class hierarchy:
     MitBlossomsSushiChef  --extends-->  SushiChef  --extends-->  BaseChef
     """
-    mitchef = MitBlossomsSushiChef()
-
     # early parsing of args to extract --part information for partial runs
-    args, options = mitchef.parse_args_and_options()
+    parts_parser = argparse.ArgumentParser(add_help=False)
+    add_chef_arguments(parts_parser)
+    parts_args, _ = parts_parser.parse_known_args()
+    wants_help = '-h' in sys.argv or '--help' in sys.argv
+
+    if 'main' in parts_args.parts or wants_help:
+        mitchef = get_sushi_chef_class()()
+        args, options = mitchef.parse_args_and_options()
+    else:
+        # fast path for partial runs: skip loading ricecooker's chef machinery
+        mitchef = MitBlossomsChefParts()
+        args, options = vars(parts_args), {}
     logger.debug('In MitBlossomsSushiChef.__main__')
     logger.debug('args= ' + str(args))
     logger.debug('options= ' + str(options))
 
+    if args['events'] and 'eventsummary' not in args['parts']:
+        open_event_stream(args['events'])
+    set_memory_budget(args['max_rss_mb'])
+    set_connection_pool_options(pool_maxsize=args['pool_maxsize'], pool_block=args['pool_block'],
+                                tcp_keepalive=not args['no_tcp_keepalive'])
+
     # Dispatch based on --part specified
     for part in args['parts']:
         if part == 'crawlonly':
-            mitchef.crawl(args, options)
+            run_part = functools.partial(mitchef.crawl, args, options)
         elif part == 'scrapeonly':
-            mitchef.scrape(args, options)
+            run_part = functools.partial(mitchef.scrape, args, options)
+        elif part == 'thumbnailsonly':
+            run_part = functools.partial(mitchef.thumbnails, args, options)
+        elif part == 'documentsonly':
+            run_part = functools.partial(mitchef.documents, args, options)
+        elif part == 'precheckonly':
+            run_part = functools.partial(mitchef.precheck, args, options)
+        elif part == 'diffonly':
+            run_part = functools.partial(mitchef.diff, args, options)
+        elif part == 'variantsonly':
+            run_part = functools.partial(mitchef.variants, args, options)
+        elif part == 'validateonly':
+            run_part = functools.partial(validate_part, args, options)
+        elif part == 'eventsummary':
+            run_part = functools.partial(events_summary_part, args, options)
+        elif part == 'benchmarkpool':
+            run_part = functools.partial(benchmark_pool_part, args, options)
+        elif part == 'webcache':
+            run_part = functools.partial(webcache_part, args, options)
         elif part == 'main':
-            mitchef.main()
+            run_part = mitchef.main
+        part_start = time.time()
+        emit_event('part_started', part=part)
+        if args['profile']:
+            profile_part(part, run_part, top_n=args['profile_top'])
+        else:
+            run_part()
+        emit_event('part_finished', part=part, duration=round(time.time() - part_start, 3))
+        log_connection_stats()
 
@@ -0,0 +1,156 @@
+import functools
+import http.server
+import os
+import sys
+import tempfile
+import threading
+
+import pytest
+
+# the chef is a single module at the root of the repo
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def pytest_configure(config):
+    # keep ricecooker's storage and file cache out of the repo (read when ricecooker is imported)
+    ricecooker_dir = tempfile.mkdtemp(prefix='ricecooker-')
+    os.environ.setdefault('RICECOOKER_STORAGE', os.path.join(ricecooker_dir, 'storage'))
+    os.environ.setdefault('RICECOOKER_FILECACHE', os.path.join(ricecooker_dir, '.ricecookerfilecache'))
+
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+
+class FixtureSiteHandler(http.server.SimpleHTTPRequestHandler):
+    """
+    Serves the saved pages in FIXTURES_DIR/blossoms, with `{{BASE_URL}}` replaced
+    by the url of the server. Paths without an extension get `.html` added.
+    The requested paths are recorded in `server.requested_paths`.
+    """
+    def do_GET(self):
+        self.server.requested_paths.append(self.path)
+        path = self.path.split('?')[0].lstrip('/')
+        if not os.path.splitext(path)[1]:
+            path += '.html'
+        local_path = os.path.join(self.directory, path)
+        if not os.path.isfile(local_path):
+            self.send_error(404)
+            return
+        with open(local_path, 'rb') as page_file:
+            body = page_file.read()
+        if local_path.endswith('.html'):
+            base_url = 'http://{}:{}'.format(*self.server.server_address[:2])
+            body = body.replace(b'{{BASE_URL}}', base_url.encode('utf8'))
+            content_type = 'text/html; charset=utf-8'
+        else:
+            content_type = self.guess_type(local_path)
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_fixture_site(directory):
+    """
+    Starts a local server for the saved pages in `directory` and returns it.
+    """
+    handler = functools.partial(FixtureSiteHandler, directory=directory)
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), handler)
+    server.requested_paths = []
+    server.url = 'http://{}:{}'.format(*server.server_address[:2])
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
+
+
+@pytest.fixture
+def blossoms_site():
+    """
+    Starts a local server for the saved MIT Blossoms pages and returns its url.
+    """
+    server = start_fixture_site(os.path.join(FIXTURES_DIR, 'blossoms'))
+    yield server.url
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def chef_dir(tmp_path, monkeypatch):
+    """
+    Runs the test in an empty chef directory, with new web sessions.
+    """
+    import mitblossoms_chef
+    monkeypatch.chdir(tmp_path)
+    os.makedirs(mitblossoms_chef.ZIP_FILES_TMP_DIR)
+    monkeypatch.setattr(mitblossoms_chef, '_SESSION', None)
+    monkeypatch.setattr(mitblossoms_chef, '_DOWNLOAD_SESSION', None)
+    return tmp_path
+
+
+@pytest.fixture
+def chef_args():
+    """
+    Returns a function that returns the chef arguments with their default
+    values, updated with its keyword arguments.
+    """
+    import argparse
+    import mitblossoms_chef
+    parser = argparse.ArgumentParser()
+    mitblossoms_chef.add_chef_arguments(parser)
+    def _chef_args(**kwargs):
+        args = vars(parser.parse_args([]))
+        args.update(kwargs)
+        return args
+    return _chef_args
+
+
+FIXTURE_LESSONS = [
+    # (topic, cluster or None, slug, title)
+    ('Mathematics', 'Probability', 'flu_math_games', 'Flu Math Games'),
+    ('Mathematics', None, 'flu_math_games', 'Flu Math Games'),
+    ('Mathematics', None, 'tragedy_commons', 'The Tragedy of the Commons'),
+    ('Chemistry', None, 'plastics_and_covalent_chemical_bonds', 'Plastics and Covalent Chemical Bonds'),
+]
+
+
+def fixture_web_resource_tree(base_url, languages=('English',)):
+    """
+    Returns the web resource tree of the FIXTURE_LESSONS, as the crawl of the
+    fixture site would, with the same lessons listed under each of `languages`.
+    """
+    lang_nodes = []
+    for lang in languages:
+        topic_nodes = []
+        for topic, cluster, slug, title in FIXTURE_LESSONS:
+            if not topic_nodes or topic_nodes[-1]['title'] != topic:
+                topic_nodes.append({'__class__': 'MitBlossomsTopic', 'title': topic, 'children': []})
+            lesson_node = {'__class__': 'MitBlossomsVideoLessonResource', 'title': title,
+                           'url': base_url + '/videos/lessons/' + slug}
+            if cluster is None:
+                topic_nodes[-1]['children'].append(lesson_node)
+            else:
+                topic_nodes[-1]['children'].append(
+                    {'__class__': 'MitBlossomsTopicCluster', 'title': cluster, 'children': [lesson_node]})
+        lang_nodes.append({'__class__': 'MitBlossomsLang', 'lang': lang, 'children': topic_nodes,
+                           'url': base_url + '/videos/by_language/' + lang.lower()})
+    return {'__class__': 'MitBlossomsResourceTree', 'children': lang_nodes}
+
+
+@pytest.fixture
+def crawled_site(blossoms_site, chef_dir, monkeypatch):
+    """
+    Prepares `chef_dir` for scraping the fixture site: writes the web resource
+    tree of the FIXTURE_LESSONS and an empty list of json tree overrides.
+    Returns the url of the fixture site.
+    """
+    import json
+    import mitblossoms_chef
+    monkeypatch.setattr(mitblossoms_chef.MitBlossomsVideoLessonResource, 'BASE_URL', blossoms_site)
+    with open(os.path.join(mitblossoms_chef.DATA_DIR, 'json_tree_overrides.json'), 'w') as overrides_file:
+        json.dump([], overrides_file)
+    mitblossoms_chef.write_json_tree(fixture_web_resource_tree(blossoms_site), 'web_resource_tree', 'json')
+    return blossoms_site
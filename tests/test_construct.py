@@ -0,0 +1,35 @@
+import logging
+
+import pytest
+
+import mitblossoms_chef
+
+# imported before the tests run, since ricecooker replaces the logging handlers when it is imported
+nodes = pytest.importorskip('ricecooker.classes.nodes')
+
+
+def make_records():
+    return [
+        {'_id': 0, '_parent': None, 'kind': 'TopicNode', 'source_id': 'root', 'title': 'root', 'children': []},
+        {'_id': 1, '_parent': 0, 'kind': 'TopicNode', 'source_id': 'biology', 'title': 'Biology', 'children': []},
+        {'_id': 2, '_parent': 1, 'kind': 'DocumentNode', 'source_id': 'doc', 'title': 'Document',
+         'files': [{'file_type': 'DocumentFile', 'path': 'document.pdf'}]},
+        {'_id': 3, '_parent': 1, 'kind': 'DocumentNode', 'source_id': 'missing', 'title': 'Missing',
+         'files': [{'file_type': 'DocumentFile', 'path': 'missing.pdf'}]},
+    ]
+
+
+def test_build_tree_from_records(tmp_path, monkeypatch, caplog):
+    monkeypatch.chdir(tmp_path)   # ricecooker's storage and file cache are relative to cwd
+    channel = nodes.ChannelNode(source_domain='test', source_id='test', title='Test', language='en')
+    timings = mitblossoms_chef._build_tree_from_records(channel, make_records())
+    assert sorted((kind, count) for kind, (count, _) in timings.items()) == [('DocumentNode', 2), ('TopicNode', 1)]
+    documents = channel.children[0].children
+    assert [node.source_id for node in documents] == ['doc', 'missing']
+    # the files are downloaded and processed by ricecooker after construct_channel returns
+    assert [node.files[0].filename for node in documents] == [None, None]
+
+    with caplog.at_level(logging.INFO, logger='mitblossoms'):
+        mitblossoms_chef.log_construct_timings(timings, 0.25)
+    assert 'DocumentNode        2 nodes' in caplog.text
+    assert 'validation took 0.250s' in caplog.text
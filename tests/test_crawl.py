@@ -0,0 +1,80 @@
+import os
+import shutil
+
+import pytest
+
+import mitblossoms_chef
+
+from conftest import FIXTURES_DIR, start_fixture_site
+
+
+def test_get_all_lessons_info_follows_pagers(blossoms_site, chef_dir):
+    lessons = list(mitblossoms_chef.get_all_lessons_info(blossoms_site + '/videos/by_language/english',
+                                                         max_workers=2))
+    urls = [lesson['url'] for lesson in lessons]
+    # page 2 is only linked from the pager of page 1
+    assert sorted(urls) == sorted(mitblossoms_chef.BASE_URL + '/videos/lessons/' + slug for slug in [
+        'flu_math_games', 'tragedy_commons', 'plastics_and_covalent_chemical_bonds', 'build_a_bridge'])
+    assert [lesson['topic'] for lesson in lessons if lesson['url'].endswith('build_a_bridge')] == ['Physics']
+
+
+def test_group_lesson_by_topic_skips_lessons_without_topic():
+    lessons = [
+        dict(topic='Physics', title='B', url='b'),
+        dict(topic=None, title='A', url='a'),
+        dict(topic='Biology', title='C', url='c'),
+        dict(topic='Physics', title='A', url='d'),
+    ]
+    topics = mitblossoms_chef.group_lesson_by_topic(lessons)
+    assert [(t['topic'], [vl['url'] for vl in t['lessons']]) for t in topics] == [
+        ('Biology', ['c']), ('Physics', ['d', 'b'])]
+
+
+@pytest.fixture
+def editable_site(tmp_path, chef_dir, monkeypatch):
+    """
+    Serves a copy of the fixture site, cached like the real site, and returns
+    the server and the directory of the copy.
+    """
+    site_dir = str(tmp_path / 'site')
+    shutil.copytree(os.path.join(FIXTURES_DIR, 'blossoms'), site_dir)
+    server = start_fixture_site(site_dir)
+    monkeypatch.setattr(mitblossoms_chef, 'BASE_URL', server.url)
+    monkeypatch.setattr(mitblossoms_chef, 'CACHED_URL_PREFIXES', [server.url])
+    yield server, site_dir
+    server.shutdown()
+    server.server_close()
+
+
+def crawled_clusters(web_resource_tree):
+    return dict((url, lesson['clusters']) for url, lesson in
+                mitblossoms_chef.index_crawled_lessons(web_resource_tree).items())
+
+
+def test_incremental_crawl_sees_new_lessons(editable_site, chef_args):
+    server, site_dir = editable_site
+    args = chef_args(languages=['English'])
+    mitblossoms_chef.crawling_part(args, {})
+    flu_url = mitblossoms_chef.canonical_lesson_url(server.url + '/videos/lessons/flu_math_games')
+    first_clusters = crawled_clusters(mitblossoms_chef.read_json_tree('web_resource_tree', 'json'))
+    assert first_clusters[flu_url] == ['Probability']
+
+    # a new lesson is published on the last listing page
+    listing_path = os.path.join(site_dir, 'videos', 'by_language', 'english', 'page', '2.html')
+    with open(listing_path) as listing_file:
+        listing = listing_file.read()
+    new_td = ('<td><div class="views-field-field-topic-value"><h4>Physics</h4></div>'
+              '<div class="views-field-title"><a href="/videos/lessons/new_lesson">New Lesson</a></div></td>')
+    with open(listing_path, 'w') as listing_file:
+        listing_file.write(listing.replace('<td></td>', new_td))
+    del server.requested_paths[:]
+
+    mitblossoms_chef.crawling_part(args, {})
+    new_url = mitblossoms_chef.canonical_lesson_url(server.url + '/videos/lessons/new_lesson')
+    second_clusters = crawled_clusters(mitblossoms_chef.read_json_tree('web_resource_tree', 'json'))
+    assert sorted(second_clusters) == sorted(list(first_clusters) + [new_url])
+    # the listings are fetched again, the lesson pages only for the new lesson
+    assert '/videos/by_language/english/page/2' in server.requested_paths
+    assert [path for path in server.requested_paths if path.startswith('/videos/lessons/')] == \
+        ['/videos/lessons/new_lesson']
+    assert second_clusters[flu_url] == ['Probability']
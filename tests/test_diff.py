@@ -0,0 +1,81 @@
+import json
+import os
+
+import pytest
+
+import mitblossoms_chef
+
+
+def document(source_id, title, path):
+    return dict(kind='DocumentNode', source_id=source_id, title=title,
+                files=[dict(file_type='DocumentFile', path=path)])
+
+
+def topic(source_id, title, children):
+    return dict(kind='TopicNode', source_id=source_id, title=title, children=children)
+
+
+@pytest.fixture
+def trees(chef_dir):
+    """
+    Writes a previous tree to chef_dir/old_tree.json and the current tree to
+    DATA_DIR/ricecooker_json_tree.json.
+    """
+    for name in ['guide.pdf', 'transcript.pdf', 'new.pdf']:
+        with open(name, 'wb') as pdf_file:
+            pdf_file.write(b'%PDF-1.4\n')
+    old_tree = dict(kind='ChannelNode', children=[
+        topic('biology', 'Biology', [
+            document('guide', 'Guide', 'guide.pdf'),
+            document('transcript', 'Transcript', 'transcript.pdf'),
+            document('removed', 'Removed', 'guide.pdf'),
+        ]),
+        topic('physics', 'Physics', []),
+    ])
+    new_tree = dict(kind='ChannelNode', children=[
+        topic('biology', 'Biology', [
+            document('transcript', 'Transcript (revised)', 'transcript.pdf'),
+        ]),
+        topic('physics', 'Physics', [
+            document('guide', 'Guide', 'guide.pdf'),
+            topic('mechanics', 'Mechanics', [document('added', 'Added', 'new.pdf')]),
+        ]),
+    ])
+    with open('old_tree.json', 'w') as tree_file:
+        json.dump(old_tree, tree_file)
+    mitblossoms_chef.write_json_tree(new_tree, 'ricecooker_json_tree', 'json')
+    return old_tree, new_tree
+
+
+def test_diff_requires_a_base(chef_args):
+    with pytest.raises(ValueError, match='--diff-base'):
+        mitblossoms_chef.diff_part(chef_args(), {})
+
+
+def test_diff_report_and_changed_subtree(trees, chef_args):
+    mitblossoms_chef.diff_part(chef_args(diff_base='old_tree.json'), {})
+    with open(mitblossoms_chef.CHANNEL_DIFF_REPORT) as report_file:
+        report = json.load(report_file)
+    assert sorted(report['added']) == ['added', 'mechanics']
+    assert report['removed'] == ['removed']
+    assert report['modified'] == ['transcript']
+    assert report['moved'] == ['guide']
+    assert report['upload_bytes'] == os.path.getsize('new.pdf')
+
+    changes_tree = mitblossoms_chef.read_json_tree('ricecooker_json_tree_changes', 'json')
+    assert [(t['source_id'], [c['source_id'] for c in t['children']]) for t in changes_tree['children']] == [
+        ('biology', ['transcript']),
+        ('physics', ['guide', 'mechanics']),
+    ]
+    assert changes_tree['children'][1]['children'][1]['children'][0]['source_id'] == 'added'
+
+
+def test_diff_dry_run_builds_the_changed_subtree(trees, chef_args, monkeypatch):
+    built_source_ids = []
+    build_node = mitblossoms_chef._build_node
+    def recording_build_node(source_node):
+        built_source_ids.append(source_node['source_id'])
+        return build_node(source_node)
+    monkeypatch.setattr(mitblossoms_chef, '_build_node', recording_build_node)
+    mitblossoms_chef.diff_part(chef_args(diff_base='old_tree.json', diff_dry_run=True), {})
+    assert built_source_ids == ['biology', 'transcript', 'physics', 'guide', 'mechanics', 'added']
@@ -0,0 +1,71 @@
+import json
+import logging
+import os
+import shutil
+
+import pytest
+from PIL import Image
+
+import mitblossoms_chef
+
+TRANSCRIPT_PATH = '/sites/default/files/video/download/flu_math_games_transcript.pdf'
+
+# render_document uses pdf2image, which runs poppler's pdftoppm
+needs_poppler = pytest.mark.skipif(shutil.which('pdftoppm') is None, reason='poppler is not installed')
+
+
+def document_tree(base_url):
+    document_node = dict(
+        kind='DocumentNode',
+        source_id='node-7647:flu_math_games_transcript.pdf',
+        title='Flu Math Games transcript',
+        files=[dict(file_type='DocumentFile', path=base_url + TRANSCRIPT_PATH)],
+    )
+    return dict(kind='ChannelNode', children=[document_node])
+
+
+@needs_poppler
+def test_documents_are_rendered_and_cached(blossoms_site, chef_dir, caplog):
+    json_tree = document_tree(blossoms_site)
+    with caplog.at_level(logging.INFO, logger='mitblossoms'):
+        manifest = mitblossoms_chef.process_documents(json_tree, max_workers=2)
+    assert 'Rendering 1 documents (0 unchanged)' in caplog.text
+    [entry] = manifest
+    assert entry['pages'] == 2
+    assert entry['size'] == os.path.getsize(os.path.join(
+        os.path.dirname(__file__), 'fixtures', 'blossoms', TRANSCRIPT_PATH.lstrip('/')))
+    with Image.open(entry['thumbnail']) as thumbnail:
+        assert thumbnail.size == mitblossoms_chef.THUMBNAIL_SIZE
+    [document_node] = json_tree['children']
+    assert document_node['thumbnail'] == entry['thumbnail']
+    assert document_node['files'][0]['path'] == entry['path']
+    assert document_node['files'][0]['source_url'] == blossoms_site + TRANSCRIPT_PATH
+
+    caplog.clear()
+    with caplog.at_level(logging.INFO, logger='mitblossoms'):
+        rerun_manifest = mitblossoms_chef.process_documents(document_tree(blossoms_site), max_workers=2)
+    assert 'Rendering 0 documents (1 unchanged)' in caplog.text
+    assert rerun_manifest == manifest
+
+
+def test_count_pdf_pages():
+    assert mitblossoms_chef.count_pdf_pages(os.path.join(
+        os.path.dirname(__file__), 'fixtures', 'blossoms', TRANSCRIPT_PATH.lstrip('/'))) == 2
+
+
+def test_unchanged_documents_are_not_rendered(blossoms_site, chef_dir, monkeypatch, caplog):
+    os.makedirs(mitblossoms_chef.DOCUMENTS_DIR)
+    transcript_path = mitblossoms_chef.download_document(blossoms_site + TRANSCRIPT_PATH)
+    thumbnail_path = os.path.join(str(chef_dir), 'thumbnail.png')
+    Image.new('RGB', mitblossoms_chef.THUMBNAIL_SIZE).save(thumbnail_path)
+    cached = dict(pages=2, size=os.path.getsize(transcript_path), thumbnail=thumbnail_path)
+    with open(mitblossoms_chef.DOCUMENTS_CACHE, 'w') as cache_file:
+        json.dump({mitblossoms_chef._sha256_file(transcript_path): cached}, cache_file)
+
+    def no_pool(*args, **kwargs):
+        raise AssertionError('no documents to render')
+    monkeypatch.setattr(mitblossoms_chef, 'ProcessPoolExecutor', no_pool)
+    with caplog.at_level(logging.INFO, logger='mitblossoms'):
+        [entry] = mitblossoms_chef.process_documents(document_tree(blossoms_site))
+    assert 'Rendering 0 documents (1 unchanged)' in caplog.text
+    assert entry['thumbnail'] == thumbnail_path
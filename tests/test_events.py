@@ -0,0 +1,44 @@
+import json
+
+import pytest
+
+import mitblossoms_chef
+
+
+@pytest.fixture
+def events_path(tmp_path, monkeypatch):
+    path = str(tmp_path / 'events.jsonl')
+    monkeypatch.setattr(mitblossoms_chef, '_EVENTS_FILE', None)
+    mitblossoms_chef.open_event_stream(path)
+    yield path
+    mitblossoms_chef._EVENTS_FILE.close()
+
+
+def test_eventsummary_requires_events():
+    with pytest.raises(ValueError, match='--events'):
+        mitblossoms_chef.events_summary_part({'events': None}, {})
+
+
+def test_item_events_are_summarized(events_path):
+    mitblossoms_chef.emit_event('file_checked', url='http://a/1.mp4', status=200, ok=True, duration=0.5)
+    mitblossoms_chef.emit_event('file_checked', url='http://a/2.mp4', status=404, ok=False, duration=0.25)
+    mitblossoms_chef.emit_event('thumbnail_fetched', url='http://a/1.png', ok=True, duration=0.125)
+    summary = mitblossoms_chef.summarize_events(mitblossoms_chef.read_events(events_path))
+    assert summary['items'] == {
+        'file_checked': dict(count=2, failed=1, total_duration=0.75),
+        'thumbnail_fetched': dict(count=1, failed=0, total_duration=0.125),
+    }
+
+
+def test_construct_emits_node_events(events_path):
+    nodes = pytest.importorskip('ricecooker.classes.nodes')
+    channel = nodes.ChannelNode(source_domain='test', source_id='test', title='Test', language='en')
+    records = [
+        {'_id': 0, '_parent': None, 'kind': 'TopicNode', 'source_id': 'root', 'title': 'root', 'children': []},
+        {'_id': 1, '_parent': 0, 'kind': 'TopicNode', 'source_id': 'biology', 'title': 'Biology', 'children': []},
+        {'_id': 2, '_parent': 1, 'kind': 'TopicNode', 'source_id': 'physics', 'title': 'Physics', 'children': []},
+    ]
+    mitblossoms_chef._build_tree_from_records(channel, records)
+    with open(events_path) as events_file:
+        events = [json.loads(line) for line in events_file]
+    assert [(e['event'], e['source_id']) for e in events] == [('node_built', 'biology'), ('node_built', 'physics')]
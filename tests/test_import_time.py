@@ -0,0 +1,63 @@
+"""
+Checks the startup time budget in `docs/import_time_budget.txt`.
+"""
+import os
+import subprocess
+import sys
+
+# bs4 and requests are imported at load time and take most of the 250 ms budget,
+# the rest of the chef module may add at most this much on top of them
+IMPORT_OVERHEAD_BUDGET_MS = 50
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY_MODULES = ('ricecooker', 'le_utils', 'cachecontrol')
+
+
+def importtime(statement):
+    """
+    Returns `{module_name: self_us}` for `python -X importtime -c "<statement>"`.
+    """
+    # measure with .pyc files, like the cron runs do
+    env = dict(os.environ)
+    env.pop('PYTHONDONTWRITEBYTECODE', None)
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', statement],
+                            cwd=REPO_DIR, env=env, capture_output=True, text=True, check=True)
+    self_times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, _, name = line[len('import time:'):].split('|')
+        self_times[name.strip()] = int(self_us)
+    return self_times
+
+
+def best_import_ms(statement, runs=5):
+    # the first run also writes the .pyc files
+    return min(sum(importtime(statement).values()) / 1000 for _ in range(runs))
+
+
+def test_import_time_budget():
+    # compared to its required dependencies, so the check doesn't depend on the machine speed
+    chef_ms = best_import_ms('import mitblossoms_chef')
+    dependencies_ms = best_import_ms('import bs4, requests')
+    assert chef_ms - dependencies_ms < IMPORT_OVERHEAD_BUDGET_MS, \
+        'import mitblossoms_chef took {:.1f} ms, bs4 and requests {:.1f} ms'.format(chef_ms, dependencies_ms)
+
+
+def test_no_heavy_modules_at_import():
+    heavy = [name for name in importtime('import mitblossoms_chef') if name.startswith(HEAVY_MODULES)]
+    assert heavy == []
+
+
+def test_chef_class_binds_sushichef():
+    import mitblossoms_chef
+    from ricecooker.chefs import SushiChef
+
+    assert not issubclass(mitblossoms_chef.MitBlossomsChefParts, SushiChef)
+    chef_class = mitblossoms_chef.get_sushi_chef_class()
+    assert chef_class is mitblossoms_chef.get_sushi_chef_class()
+    assert chef_class.__mro__[1:3] == (mitblossoms_chef.MitBlossomsChefParts, SushiChef)
+    chef = chef_class()
+    assert isinstance(chef, SushiChef)
+    assert isinstance(chef, mitblossoms_chef.MitBlossomsChefParts)
+    assert not issubclass(mitblossoms_chef.MitBlossomsChefParts, SushiChef)
+    assert '--parts' in chef.arg_parser.format_help()
@@ -0,0 +1,40 @@
+import os
+
+import pytest
+
+import mitblossoms_chef
+
+
+JSON_TREE = {
+    'kind': 'TopicNode', 'title': 'root', 'children': [
+        {'kind': 'TopicNode', 'title': 'Biology', 'children': [
+            {'kind': 'VideoNode', 'title': 'Flu math games', 'files': []},
+        ]},
+        {'kind': 'TopicNode', 'title': 'Physics', 'children': []},
+    ]
+}
+
+
+@pytest.fixture
+def data_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(mitblossoms_chef, 'DATA_DIR', str(tmp_path))
+    return tmp_path
+
+
+@pytest.mark.parametrize('tree_format', mitblossoms_chef.TREE_FORMATS)
+def test_json_tree_round_trip(data_dir, tree_format):
+    path = mitblossoms_chef.write_json_tree(JSON_TREE, 'tree', tree_format)
+    assert path == os.path.join(str(data_dir), 'tree.' + tree_format)
+    assert mitblossoms_chef.read_json_tree('tree', tree_format) == JSON_TREE
+    records = list(mitblossoms_chef.iter_json_tree_records('tree', tree_format))
+    assert [record['title'] for record in records] == ['root', 'Biology', 'Flu math games', 'Physics']
+
+
+def test_read_json_tree_uses_given_format(data_dir):
+    mitblossoms_chef.write_json_tree(JSON_TREE, 'tree', 'json')
+    newer_tree = dict(JSON_TREE, title='newer')
+    mitblossoms_chef.write_json_tree(newer_tree, 'tree', 'jsonl.gz')
+    assert mitblossoms_chef.read_json_tree('tree', 'json') == JSON_TREE
+    assert mitblossoms_chef.read_json_tree('tree', 'jsonl.gz') == newer_tree
+    with pytest.raises(FileNotFoundError, match='tree.json, .*jsonl.gz'):
+        mitblossoms_chef.read_json_tree('tree', 'jsonl')
@@ -0,0 +1,93 @@
+"""
+Scrapes the saved lesson pages in tests/fixtures/blossoms and checks that the
+memory used by the scrape doesn't grow with the number of lessons (see MEMORY
+BUDGET in mitblossoms_chef.py).
+"""
+import os
+import tracemalloc
+import zipfile
+
+import pytest
+
+import mitblossoms_chef
+from mitblossoms_chef import MitBlossomsVideoLessonResource
+
+LESSON_SLUGS = ['flu_math_games', 'tragedy_commons', 'plastics_and_covalent_chemical_bonds']
+LANGUAGES = ['English', 'Arabic', 'Hindi']
+MAX_RSS_MB = 400               # the --max-rss-mb of our CI runs, see README
+MAX_TRACED_PEAK_MB = 10        # python allocations while scraping
+
+
+@pytest.fixture
+def lesson_urls(blossoms_site, chef_dir, monkeypatch):
+    monkeypatch.setattr(MitBlossomsVideoLessonResource, 'BASE_URL', blossoms_site)
+    def _lesson_urls(num_copies):
+        # each saved page is served under `num_copies` urls, so every lesson is fetched and parsed
+        return [blossoms_site + '/videos/lessons/' + slug + '?copy=' + str(i)
+                for i in range(num_copies) for slug in LESSON_SLUGS]
+    return _lesson_urls
+
+
+def scrape_lesson(url):
+    lesson = MitBlossomsVideoLessonResource(
+        {'__class__': 'MitBlossomsVideoLessonResource', 'url': url, 'title': url})
+    scraped = dict(
+        source_id=lesson.get_source_id(),
+        teachers=lesson.get_teachers(),
+        description=lesson.get_video_summary(),
+        thumbnail=lesson.get_thumbnail_url(),
+        for_teachers=lesson.get_for_teachers(),
+        transcripts=lesson.get_transcripts(),
+        additional_resources=lesson.get_additional_resources_zip(),
+        videos=[lesson.get_video_url_for_lang(lang) for lang in LANGUAGES],
+    )
+    lesson.close()
+    mitblossoms_chef.check_memory_budget()
+    return scraped
+
+
+def traced_peak_mb(urls):
+    tracemalloc.start()
+    try:
+        scraped = [scrape_lesson(url) for url in urls]
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return scraped, peak / 1024 / 1024
+
+
+def test_scraped_lesson(lesson_urls):
+    scraped = scrape_lesson(lesson_urls(1)[0])
+    assert scraped['source_id'] == 'node-7647'
+    assert scraped['teachers'] == ['Elizabeth Smith']
+    assert [doc['file_name'] for doc in scraped['for_teachers']] == ['flu_math_games_teachers_guide.pdf']
+    assert scraped['videos'] == [
+        ('English', 'http://cdn.example.org/flu_math_games_0.mp4'),
+        ('Arabic', 'http://cdn.example.org/flu_math_games_1.mp4'),
+        (None, None),
+    ]
+    with zipfile.ZipFile(scraped['additional_resources']) as zfile:
+        info = zfile.getinfo('index.html')
+        assert info.date_time == (2015, 10, 21, 7, 28, 0)
+        index_html = zfile.read('index.html').decode('utf8')
+    assert '<a ' not in index_html and 'lesson-resources-block' in index_html
+
+
+def test_scrape_memory_does_not_grow_with_lessons(lesson_urls, monkeypatch):
+    monkeypatch.setattr(mitblossoms_chef, '_MAX_RSS_MB', MAX_RSS_MB)
+    traced_peak_mb(lesson_urls(1))   # warm up the session and the regex caches
+    _, small_peak_mb = traced_peak_mb(lesson_urls(1))
+    scraped, large_peak_mb = traced_peak_mb(lesson_urls(4))
+    assert len(scraped) == 4 * len(LESSON_SLUGS)
+    assert large_peak_mb < MAX_TRACED_PEAK_MB
+    # 4x the lessons, but each lesson page is freed before the next one is parsed
+    assert large_peak_mb < 1.5 * small_peak_mb, (small_peak_mb, large_peak_mb)
+    assert mitblossoms_chef.get_peak_rss_mb() < MAX_RSS_MB
+
+
+def test_check_memory_budget(monkeypatch):
+    monkeypatch.setattr(mitblossoms_chef, '_MAX_RSS_MB', None)
+    mitblossoms_chef.check_memory_budget()
+    monkeypatch.setattr(mitblossoms_chef, '_MAX_RSS_MB', 1)
+    with pytest.raises(MemoryError):
+        mitblossoms_chef.check_memory_budget()
@@ -0,0 +1,29 @@
+import json
+
+import pytest
+
+import mitblossoms_chef
+
+
+def test_repo_overrides_are_valid():
+    tree_overrides = mitblossoms_chef.load_json_tree_overrides()
+    assert tree_overrides
+
+
+def test_overrides_cannot_change_titles(tmp_path):
+    overrides_path = str(tmp_path / 'json_tree_overrides.json')
+    with open(overrides_path, 'w') as overrides_file:
+        json.dump([{'match': {'source_id': 'node-7647'}, 'update': {'title': 'Flu'}}], overrides_file)
+    with pytest.raises(ValueError, match='cannot update title'):
+        mitblossoms_chef.load_json_tree_overrides(overrides_path)
+
+
+def test_overrides_apply_to_every_copy_of_a_lesson():
+    lesson = dict(kind='TopicNode', source_id='node-7647', title='Flu', author='MIT Blossoms', children=[])
+    json_tree = dict(kind='ChannelNode', children=[
+        dict(kind='TopicNode', source_id='topic-a', title='A', children=[dict(lesson)]),
+        dict(kind='TopicNode', source_id='topic-b', title='B', children=[dict(lesson)]),
+    ])
+    tree_overrides = [{'match': {'kind': 'TopicNode', 'source_id': 'node-7647'}, 'update': {'author': 'Dr. Surif'}}]
+    mitblossoms_chef.apply_json_tree_overrides(json_tree, tree_overrides)
+    assert [topic['children'][0]['author'] for topic in json_tree['children']] == ['Dr. Surif', 'Dr. Surif']
@@ -0,0 +1,49 @@
+import mitblossoms_chef
+
+from conftest import fixture_web_resource_tree
+
+
+def lesson_titles(node):
+    return [(child['source_id'], child['title']) for child in node['children']]
+
+
+def test_only_lesson_patches_one_lesson(crawled_site, chef_args):
+    mitblossoms_chef.scraping_part(chef_args(), {})
+    json_tree = mitblossoms_chef.read_json_tree('ricecooker_json_tree', 'json')
+    mathematics = json_tree['children'][0]
+    [tragedy_commons] = [c for c in mathematics['children'] if c['source_id'] == 'node-6534']
+    tragedy_commons['title'] = 'Stale title'
+    tragedy_commons['children'] = []
+    mitblossoms_chef.write_json_tree(json_tree, 'ricecooker_json_tree', 'json')
+
+    mitblossoms_chef.partial_scraping_part(chef_args(only_lesson=['node-6534']), {})
+    patched_tree = mitblossoms_chef.read_json_tree('ricecooker_json_tree', 'json')
+    patched_mathematics = patched_tree['children'][0]
+    # the cluster, the other lesson in the topic, and the other topic are unchanged
+    assert lesson_titles(patched_mathematics) == [
+        ('mit_blossoms_cluster_Probability', 'Probability'),
+        ('node-7647', 'Flu Math Games'),
+        ('node-6534', 'The Tragedy of the Commons'),
+    ]
+    for i in [0, 1]:
+        assert patched_mathematics['children'][i] == mathematics['children'][i]
+    assert patched_tree['children'][1] == json_tree['children'][1]
+    [patched_lesson] = [c for c in patched_mathematics['children'] if c['source_id'] == 'node-6534']
+    assert patched_lesson['children']
+
+
+def test_lesson_node_ids_are_resolved_from_each_lesson_page_once(crawled_site, monkeypatch):
+    web_resource_tree = fixture_web_resource_tree(crawled_site, languages=['English', 'Arabic', 'Hindi'])
+    fetched_urls = []
+    lesson_init = mitblossoms_chef.MitBlossomsVideoLessonResource.__init__
+    def counting_init(lesson, data):
+        fetched_urls.append(data['url'])
+        lesson_init(lesson, data)
+    monkeypatch.setattr(mitblossoms_chef.MitBlossomsVideoLessonResource, '__init__', counting_init)
+
+    lesson_urls = mitblossoms_chef.resolve_lesson_urls(
+        ['node-9120', 'node-0000'], web_resource_tree, dict(kind='ChannelNode', children=[]))
+    assert lesson_urls == set([mitblossoms_chef.canonical_lesson_url(
+        crawled_site + '/videos/lessons/plastics_and_covalent_chemical_bonds')])
+    # node-0000 doesn't exist, so all the lesson pages are looked at
+    assert len(fetched_urls) == len(set(fetched_urls)) == 3
@@ -0,0 +1,60 @@
+import mitblossoms_chef
+
+
+def lesson(slug):
+    return dict(__class__='MitBlossomsLessonResource', title=slug.title(),
+                url='https://blossoms.mit.edu/videos/lessons/' + slug)
+
+
+def web_resource_tree():
+    """
+    Two languages with the same topics: a topic cluster of five lessons and
+    four lessons that are not in a cluster, one of which is only in English.
+    """
+    lang_nodes = []
+    for lang in ['English', 'Spanish']:
+        cluster = dict(__class__='MitBlossomsTopicCluster', title='Probability',
+                       children=[lesson('cluster_{}'.format(i)) for i in range(5)])
+        unclustered = [lesson('lesson_{}'.format(i)) for i in range(3 if lang == 'Spanish' else 4)]
+        topic = dict(__class__='MitBlossomsTopic', title='Mathematics', children=[cluster] + unclustered)
+        lang_nodes.append(dict(__class__='MitBlossomsLang', title=lang, children=[topic]))
+    return dict(__class__='MitBlossomsResourceTree', title='MIT Blossoms', children=lang_nodes)
+
+
+def sampled_paths(tree):
+    paths = []
+    for lang_node in tree['children']:
+        for topic_node in lang_node['children']:
+            for child in topic_node['children']:
+                if child['__class__'] == 'MitBlossomsTopicCluster':
+                    paths.extend((lang_node['title'], topic_node['title'], child['title'], n['url'])
+                                 for n in child['children'])
+                else:
+                    paths.append((lang_node['title'], topic_node['title'], None, child['url']))
+    return paths
+
+
+def test_same_seed_gives_same_sample():
+    tree = web_resource_tree()
+    first = sampled_paths(mitblossoms_chef.sample_web_resource_tree(tree, sample_size=2, seed=7))
+    second = sampled_paths(mitblossoms_chef.sample_web_resource_tree(web_resource_tree(), sample_size=2, seed=7))
+    assert first == second
+    seeds = [sampled_paths(mitblossoms_chef.sample_web_resource_tree(tree, sample_size=2, seed=seed))
+             for seed in range(10)]
+    assert len(set(map(tuple, seeds))) > 1
+
+
+def test_sampled_lessons_keep_their_topic_path():
+    tree = web_resource_tree()
+    all_paths = set(sampled_paths(tree))
+    for seed in range(10):
+        paths = sampled_paths(mitblossoms_chef.sample_web_resource_tree(tree, sample_size=2, seed=seed))
+        assert set(paths) <= all_paths
+        # two lessons of the cluster and of the other lessons of the topic, the same in every language
+        english = [path[2:] for path in paths if path[0] == 'English']
+        assert len([p for p in english if p[0] == 'Probability']) == 2
+        assert len([p for p in english if p[0] is None]) == 2
+        spanish = [path[2:] for path in paths if path[0] == 'Spanish']
+        assert set(spanish) <= set(english)
+    # the input tree is left alone
+    assert set(sampled_paths(tree)) == all_paths and len(all_paths) == 17
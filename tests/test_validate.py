@@ -0,0 +1,69 @@
+import json
+import os
+import time
+
+import pytest
+
+import mitblossoms_chef
+
+
+def video(source_id, path, language='en'):
+    return dict(kind='VideoNode', source_id=source_id, title=source_id, language=language,
+                files=[dict(file_type='VideoFile', path=path, language=language)])
+
+
+def channel(*children):
+    return dict(kind='ChannelNode', children=[
+        dict(kind='TopicNode', source_id='topic', title='Topic', children=list(children))])
+
+
+def problems(json_tree):
+    return mitblossoms_chef.validate_json_tree_records(mitblossoms_chef.iter_tree_records(json_tree))
+
+
+def test_valid_tree(tmp_path):
+    local_path = str(tmp_path / 'video.mp4')
+    open(local_path, 'w').close()
+    assert problems(channel(video('local', local_path), video('remote', 'https://example.org/v.mp4'))) == []
+
+
+def test_missing_video_file(tmp_path):
+    missing_path = str(tmp_path / 'missing.mp4')
+    assert problems(channel(video('v', missing_path))) == [('v', 'missing local file ' + missing_path)]
+
+
+def test_unknown_language():
+    assert problems(channel(video('v', 'https://example.org/v.mp4', language='xx'))) == [
+        ('v', 'unknown language xx'), ('v', 'unknown VideoFile language xx')]
+
+
+def test_duplicate_source_id_among_siblings_only():
+    url = 'https://example.org/v.mp4'
+    assert problems(channel(video('v', url), video('v', url))) == [('v', 'duplicate source_id among siblings')]
+    json_tree = dict(kind='ChannelNode', children=[
+        dict(kind='TopicNode', source_id=topic, title=topic, children=[video('v', url)])
+        for topic in ['a', 'b']])
+    assert problems(json_tree) == []
+
+
+def test_validation_time_is_linear():
+    def validation_seconds(num_videos):
+        json_tree = channel(*[video(str(i), 'https://example.org/{}.mp4'.format(i)) for i in range(num_videos)])
+        records = list(mitblossoms_chef.iter_tree_records(json_tree))
+        timings = []
+        for _ in range(3):
+            start = time.perf_counter()
+            assert mitblossoms_chef.validate_json_tree_records(records) == []
+            timings.append(time.perf_counter() - start)
+        return min(timings)
+    # 8 times the nodes take about 8 times as long (64 times if it were quadratic)
+    assert validation_seconds(16000) < 20 * validation_seconds(2000)
+
+
+def test_invalid_scrape_is_not_written(crawled_site, chef_args):
+    with open(os.path.join(mitblossoms_chef.DATA_DIR, 'json_tree_overrides.json'), 'w') as overrides_file:
+        json.dump([{'match': {'kind': 'VideoNode'}, 'update': {'language': 'xx'}}], overrides_file)
+    with pytest.raises(ValueError, match='ricecooker_json_tree has .* problems'):
+        mitblossoms_chef.scraping_part(chef_args(), {})
+    assert not os.path.exists(os.path.join(mitblossoms_chef.DATA_DIR, 'ricecooker_json_tree.json'))
+    assert mitblossoms_chef.read_lesson_catalog() is None
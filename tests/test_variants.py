@@ -0,0 +1,35 @@
+import json
+import os
+
+import mitblossoms_chef
+
+from conftest import fixture_web_resource_tree
+
+
+def test_projected_tree_is_the_tree_scraped_for_the_language(crawled_site, chef_args):
+    with open(os.path.join(mitblossoms_chef.DATA_DIR, 'json_tree_overrides.json'), 'w') as overrides_file:
+        json.dump([{'match': {'kind': 'TopicNode', 'title': 'The Tragedy of the Commons'},
+                    'update': {'description': 'Overridden'}}], overrides_file)
+    mitblossoms_chef.scraping_part(chef_args(languages=['English']), {})
+    scraped_tree = mitblossoms_chef.read_json_tree('ricecooker_json_tree', 'json')
+    catalog = mitblossoms_chef.read_lesson_catalog()
+    # the catalog has the lesson folders as scraped, without the overrides
+    assert 'Overridden' not in json.dumps(catalog)
+    projected_tree = mitblossoms_chef.project_json_tree(
+        mitblossoms_chef.read_json_tree('web_resource_tree', 'json'), catalog, ['English'],
+        tree_overrides=mitblossoms_chef.load_json_tree_overrides())
+    assert 'Overridden' in json.dumps(projected_tree)
+    assert projected_tree == scraped_tree
+
+
+def test_projected_variants_leave_the_catalog_alone(crawled_site, chef_args):
+    mitblossoms_chef.write_json_tree(fixture_web_resource_tree(crawled_site, languages=('English', 'Spanish')),
+                                     'web_resource_tree', 'json')
+    mitblossoms_chef.scraping_part(chef_args(languages=['English', 'Spanish']), {})
+    catalog = mitblossoms_chef.read_lesson_catalog()
+    catalog_copy = json.loads(json.dumps(catalog))
+    web_resource_tree = mitblossoms_chef.read_json_tree('web_resource_tree', 'json')
+    english_tree = mitblossoms_chef.project_json_tree(web_resource_tree, catalog, ['English'])
+    mitblossoms_chef.project_json_tree(web_resource_tree, catalog, ['Spanish'])
+    assert catalog == catalog_copy
+    assert english_tree == mitblossoms_chef.project_json_tree(web_resource_tree, catalog, ['English'])
@@ -0,0 +1,65 @@
+import copy
+import logging
+import os
+
+import mitblossoms_chef
+
+VIDEO_URLS = ['http://cdn.example.org/a.mp4', 'http://cdn.example.org/b.mp4', 'http://cdn.example.org/c.mp4']
+
+
+def fake_download_video(url):
+    if url.endswith('b.mp4'):
+        raise ValueError('unexpected error for ' + url)
+    path = mitblossoms_chef.video_download_path(url)
+    with open(path, 'wb') as video_file:
+        video_file.write(b'mp4')
+    return path
+
+
+def fake_head_remote_file(url):
+    if url.endswith('c.mp4'):
+        raise KeyError('content-length')
+    return dict(url=url, ok=True, content_length=100)
+
+
+def test_scheduler_reports_errors_and_keeps_downloading(chef_dir, monkeypatch, caplog):
+    monkeypatch.setattr(mitblossoms_chef, 'download_video', fake_download_video)
+    monkeypatch.setattr(mitblossoms_chef, 'head_remote_file', fake_head_remote_file)
+    scheduler = mitblossoms_chef.VideoDownloadScheduler(max_workers=1)
+    for url in VIDEO_URLS:
+        scheduler.schedule(url)
+    with caplog.at_level(logging.ERROR, logger='mitblossoms'):
+        paths_by_url = scheduler.join()
+    assert paths_by_url == {
+        VIDEO_URLS[0]: mitblossoms_chef.video_download_path(VIDEO_URLS[0]),
+        VIDEO_URLS[1]: None,      # the worker thread survives the error
+        VIDEO_URLS[2]: mitblossoms_chef.video_download_path(VIDEO_URLS[2]),   # sized as 0
+    }
+    assert list(scheduler.errors) == [VIDEO_URLS[1]]
+    assert 'Video download of ' + VIDEO_URLS[1] + ' failed' in caplog.text
+    assert '1 of 3 video downloads failed' in caplog.text
+
+
+def make_tree():
+    video_node = dict(kind='VideoNode', source_id='video-1', title='Video', files=[
+        dict(file_type='VideoFile', path=VIDEO_URLS[0], ffmpeg_settings={'crf': 24}, language='en')])
+    return dict(kind='ChannelNode', children=[
+        dict(kind='TopicNode', source_id='lesson-1', title='Lesson', children=[video_node])])
+
+
+def test_localized_videos_are_not_changes(chef_dir):
+    old_tree = make_tree()
+    new_tree = make_tree()
+    os.makedirs(mitblossoms_chef.VIDEOS_DIR)
+    local_path = fake_download_video(VIDEO_URLS[0])
+    assert mitblossoms_chef.localize_videos(new_tree, {VIDEO_URLS[0]: local_path}) == 1
+    video_file = new_tree['children'][0]['children'][0]['files'][0]
+    assert video_file['path'] == local_path and video_file['source_url'] == VIDEO_URLS[0]
+
+    report = mitblossoms_chef.diff_json_trees(old_tree, new_tree)
+    assert report['modified'] == [] and report['files_changed'] == []
+
+    changed_tree = copy.deepcopy(new_tree)
+    changed_tree['children'][0]['children'][0]['files'][0]['source_url'] = VIDEO_URLS[1]
+    report = mitblossoms_chef.diff_json_trees(old_tree, changed_tree)
+    assert report['files_changed'] == ['video-1']
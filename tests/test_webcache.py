@@ -0,0 +1,56 @@
+import json
+import os
+
+import pytest
+
+import mitblossoms_chef
+
+
+def webcache_args(**kwargs):
+    args = dict(cache_host=None, cache_match=None, cache_older_than=None, cache_prune=False,
+                cache_prune_all=False, cache_pack=None, cache_unpack=None)
+    args.update(kwargs)
+    return args
+
+
+@pytest.fixture
+def webcache(chef_dir):
+    """
+    A web cache with two indexed responses and one from before the index.
+    """
+    urls = ['https://blossoms.mit.edu/videos/lessons/a', 'https://www.youtube.com/watch?v=b']
+    for url in urls + ['https://blossoms.mit.edu/unindexed']:
+        path = mitblossoms_chef._webcache_key_path(url)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as cache_file:
+            cache_file.write(b'cached response')
+    with open(os.path.join(mitblossoms_chef.WEBCACHE_DIR, mitblossoms_chef.WEBCACHE_INDEX), 'w') as index_file:
+        for url in urls:
+            index_file.write(json.dumps(dict(url=url)) + '\n')
+    return urls
+
+
+def cached_hosts():
+    return sorted(e['host'] for e in mitblossoms_chef.list_webcache_entries())
+
+
+def test_unindexed_entries_are_listed_under_question_mark(webcache):
+    assert cached_hosts() == ['?', 'blossoms.mit.edu', 'www.youtube.com']
+
+
+def test_prune_requires_a_filter(webcache):
+    with pytest.raises(ValueError, match='--cache-prune-all'):
+        mitblossoms_chef.webcache_part(webcache_args(cache_prune=True), {})
+    assert len(cached_hosts()) == 3
+
+
+def test_prune_selected_hosts(webcache):
+    mitblossoms_chef.webcache_part(webcache_args(cache_prune=True, cache_host=['?', 'www.youtube.com']), {})
+    assert cached_hosts() == ['blossoms.mit.edu']
+    index_path = os.path.join(mitblossoms_chef.WEBCACHE_DIR, mitblossoms_chef.WEBCACHE_INDEX)
+    assert mitblossoms_chef.read_webcache_index(index_path) == [webcache[0]]
+
+
+def test_prune_all(webcache):
+    mitblossoms_chef.webcache_part(webcache_args(cache_prune_all=True), {})
+    assert cached_hosts() == []